@@ -0,0 +1,11 @@
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+
+""" dircolors module __main__ wrapper, outputs shell code to set LS_COLORS """
+
+import sys
+
+from .cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
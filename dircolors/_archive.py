@@ -0,0 +1,109 @@
+# private archive reading functions for pydircolors
+#
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+
+""" private helpers to read file metadata out of tar and zip archives without extracting them """
+
+from collections import namedtuple
+import stat
+import tarfile
+import zipfile
+import zlib
+
+__all__ = ['ArchiveMember', 'iter_archive']
+
+# name: member path as stored in the archive, without a trailing slash
+# mode: st_mode-style integer including the S_IFMT file type bits
+# target: symlink or hardlink target, or None
+# hardlink: True if target is a hardlink rather than a symlink
+ArchiveMember = namedtuple('ArchiveMember', ['name', 'mode', 'target', 'hardlink'])
+
+# map tarfile member types to stat file types. Hard links are shown as regular files.
+_TAR_TYPES = {
+    tarfile.REGTYPE:    stat.S_IFREG,
+    tarfile.AREGTYPE:   stat.S_IFREG,
+    tarfile.CONTTYPE:   stat.S_IFREG,
+    tarfile.LNKTYPE:    stat.S_IFREG,
+    tarfile.SYMTYPE:    stat.S_IFLNK,
+    tarfile.DIRTYPE:    stat.S_IFDIR,
+    tarfile.CHRTYPE:    stat.S_IFCHR,
+    tarfile.BLKTYPE:    stat.S_IFBLK,
+    tarfile.FIFOTYPE:   stat.S_IFIFO,
+}
+
+# errors from damaged or truncated archives, which are reported as ValueError
+_ARCHIVE_ERRORS = (tarfile.TarError, zipfile.BadZipFile, EOFError, zlib.error)
+
+# zip external_attr stores the unix st_mode in its upper 16 bits when created on unix
+_ZIP_UNIX_SYSTEM = 3
+
+def _iter_tar(tar):
+    """ iterate over the members of an open TarFile, which should have been opened in
+    stream mode. """
+    for info in tar:
+        mode = _TAR_TYPES.get(info.type, stat.S_IFREG) | stat.S_IMODE(info.mode)
+        target = info.linkname if (info.issym() or info.islnk()) else None
+        yield ArchiveMember(info.name.rstrip('/'), mode, target, info.islnk())
+        # TarFile remembers every member it has read, drop them to keep memory use constant
+        tar.members = []
+    # TarFile stops quietly at a short read too, a complete archive ends with a full block
+    # of zeros, which leaves the file position one block past the end of the last member
+    if tar.fileobj.tell() < tar.offset + tarfile.BLOCKSIZE:
+        raise tarfile.ReadError('unexpected end of data')
+
+def _iter_zip(zfile):
+    """ iterate over the members of an open ZipFile """
+    for info in zfile.infolist():
+        mode = info.external_attr >> 16 if info.create_system == _ZIP_UNIX_SYSTEM else 0
+        if not stat.S_IFMT(mode):
+            # no unix mode stored, guess based on the name like unzip does
+            mode = stat.S_IFDIR | 0o755 if info.filename.endswith('/') else stat.S_IFREG | 0o644
+        target = None
+        if stat.S_ISLNK(mode):
+            # zip symlinks store their target as the file contents
+            target = zfile.read(info).decode('utf-8', 'surrogateescape')
+        yield ArchiveMember(info.filename.rstrip('/'), mode, target, False)
+
+def iter_archive(archive):
+    """ Generator yielding an ArchiveMember for each entry in a tar or zip archive.
+    archive can be a filename or a binary file object. Tar archives (optionally compressed)
+    are read in a single streaming pass, so non-seekable file objects work too.
+    Zip archives must be seekable since the member list is at the end of the file.
+
+    Raises ValueError if the archive isn't a recognized format or is damaged (possibly
+    after yielding some members), or any of the usual OSError exceptions if it can't be
+    read. """
+    if isinstance(archive, str):
+        is_zip = zipfile.is_zipfile(archive)
+    elif hasattr(archive, 'read'):
+        is_zip = archive.seekable() and zipfile.is_zipfile(archive)
+        if archive.seekable():
+            archive.seek(0)
+    else:
+        raise ValueError('archive must be str or a binary file object, not %s'%type(archive))
+
+    if is_zip:
+        try:
+            with zipfile.ZipFile(archive) as zfile:
+                yield from _iter_zip(zfile)
+        except _ARCHIVE_ERRORS as e:
+            raise ValueError('damaged zip archive: %s'%e) from e
+        return
+
+    try:
+        if isinstance(archive, str):
+            tar = tarfile.open(archive, 'r|*')
+        else:
+            tar = tarfile.open(fileobj=archive, mode='r|*')
+    except tarfile.ReadError as e:
+        raise ValueError('not a tar or zip archive: %s'%e) from e
+    except (_ARCHIVE_ERRORS + (TypeError,)) as e:
+        # tarfile raises TypeError for a gzip header which is cut short
+        raise ValueError('damaged tar archive: %s'%e) from e
+
+    try:
+        with tar:
+            yield from _iter_tar(tar)
+    except _ARCHIVE_ERRORS as e:
+        raise ValueError('damaged tar archive: %s'%e) from e
@@ -0,0 +1,133 @@
+# Color depth conversion for pydircolors
+#
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+
+""" private helpers to downconvert 24-bit and 256-color SGR codes for terminals with
+fewer colors. All nearest-color searches are done once at import time, so converting
+a color is only a few table lookups. """
+
+from collections import OrderedDict
+
+__all__ = ['DEPTHS', 'convert_sgr', 'translate_table']
+
+# supported target color depths, in number of colors
+DEPTHS = (256, 16)
+
+# the standard xterm palette: 16 basic colors, a 6x6x6 color cube, and 24 grays
+_BASIC_COLORS = (
+    (0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0),
+    (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229),
+    (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0),
+    (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255),
+)
+_CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+_GRAY_LEVELS = tuple(8 + 10 * i for i in range(24))
+
+_PALETTE = (list(_BASIC_COLORS) +
+            [(r, g, b) for r in _CUBE_LEVELS for g in _CUBE_LEVELS for b in _CUBE_LEVELS] +
+            [(v, v, v) for v in _GRAY_LEVELS])
+
+def _nearest(value, levels):
+    """ index of the closest entry of levels to value """
+    return min(range(len(levels)), key=lambda i: abs(levels[i] - value))
+
+def _distance(color1, color2):
+    """ squared distance between two (r, g, b) tuples """
+    return sum((a - b) * (a - b) for a, b in zip(color1, color2))
+
+# channel value (0-255) -> index of the nearest cube level, and average value -> nearest gray
+_CUBE_INDEX = tuple(_nearest(v, _CUBE_LEVELS) for v in range(256))
+_GRAY_INDEX = tuple(_nearest(v, _GRAY_LEVELS) for v in range(256))
+# 256-color index -> nearest basic color index
+_NEAREST_BASIC = tuple(range(16)) + tuple(
+    min(range(16), key=lambda i, c=color: _distance(_BASIC_COLORS[i], c))
+    for color in _PALETTE[16:])
+
+def _rgb_to_256(r, g, b):
+    """ nearest 256-color index to a 24-bit color, choosing between the closest
+    color cube entry and the closest gray """
+    ri, gi, bi = _CUBE_INDEX[r], _CUBE_INDEX[g], _CUBE_INDEX[b]
+    cr, cg, cb = _CUBE_LEVELS[ri], _CUBE_LEVELS[gi], _CUBE_LEVELS[bi]
+    gray_index = _GRAY_INDEX[(r + g + b) // 3]
+    gray = _GRAY_LEVELS[gray_index]
+    cube_dist = (cr - r) * (cr - r) + (cg - g) * (cg - g) + (cb - b) * (cb - b)
+    gray_dist = (gray - r) * (gray - r) + (gray - g) * (gray - g) + (gray - b) * (gray - b)
+    if cube_dist <= gray_dist:
+        return 16 + 36 * ri + 6 * gi + bi
+    return 232 + gray_index
+
+def _color_params(background, index, depth):
+    """ SGR parameters selecting palette color index as the foreground or background """
+    if depth == 256:
+        return ['48' if background else '38', '5', str(index)]
+    index = _NEAREST_BASIC[index]
+    if index < 8:
+        return [str((40 if background else 30) + index)]
+    return [str((100 if background else 90) + index - 8)]
+
+def _parse_color(args):
+    """ Parse the arguments following an extended color SGR parameter (38 or 48), i.e.
+    ['5', n] or ['2', r, g, b]. Returns a tuple (palette_index, rgb, count) with one of
+    palette_index or rgb set, and count being the number of arguments used.
+    Raises ValueError if args aren't a valid color. """
+    if args[0] == '5':
+        index = int(args[1])
+        if not 0 <= index < 256:
+            raise ValueError('invalid palette index %d'%index)
+        return index, None, 2
+    if args[0] == '2':
+        rgb = tuple(map(int, args[1:4]))
+        if len(rgb) != 3 or min(rgb) < 0 or max(rgb) > 255:
+            raise ValueError('invalid RGB color %r'%(rgb,))
+        return None, rgb, 4
+    raise ValueError('unknown color type %r'%args[0])
+
+def convert_sgr(value, depth):
+    """ Convert the extended colors in an SGR value string like '01;38;2;255;128;0' to
+    their nearest equivalent with depth colors (256 or 16). Other parameters, and anything
+    that can't be parsed, are left unchanged. Colon-separated forms like '38:2::255:128:0'
+    are accepted too. """
+    if '38' not in value and '48' not in value:
+        return value # fast path, nothing to convert
+    params = value.split(';')
+    out = []
+    i = 0
+    while i < len(params):
+        param = params[i]
+        if ':' in param:
+            # ITU T.416 form, all arguments in one parameter, with an optional
+            # color space ID before the RGB values
+            args = param.split(':')
+            if len(args) == 6 and args[1] == '2':
+                del args[2]
+            param, args, used = args[0], args[1:], 1
+        else:
+            args, used = params[i+1:i+5], None
+        if param in ('38', '48'):
+            try:
+                index, rgb, count = _parse_color(args)
+            except (ValueError, IndexError):
+                pass
+            else:
+                if rgb is not None:
+                    index = _rgb_to_256(*rgb)
+                out += _color_params(param == '48', index, depth)
+                i += used or count + 1
+                continue
+        out.append(params[i])
+        i += 1
+    return ';'.join(out)
+
+def translate_table(table, depth):
+    """ Return a new OrderedDict with every value of table passed through convert_sgr.
+    Each distinct value is only converted once, since themes tend to reuse a handful
+    of colors for many extensions. """
+    converted = {}
+    result = OrderedDict()
+    for key, value in table.items():
+        new_value = converted.get(value)
+        if new_value is None:
+            new_value = converted[value] = convert_sgr(value, depth)
+        result[key] = new_value
+    return result
@@ -0,0 +1,173 @@
+# Command line interface for pydircolors, a cached replacement for GNU `dircolors`
+#
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+
+""" dircolors command line interface. Outputs shell code to set LS_COLORS like GNU dircolors,
+and caches the result so that repeated calls (e.g. from every shell startup) are cheap. """
+
+from io import StringIO
+import os
+import sys
+import zlib
+
+from . import __version__
+from .dircolors import Dircolors
+from ._defaults import DEFAULT_DIRCOLORS
+
+__all__ = ['generate_shell_code', 'cached_shell_code', 'main']
+
+_SHELL_FORMATS = ('bourne', 'csh')
+
+def _cache_dir():
+    """ return the directory where generated shell code is cached """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pydircolors')
+
+def _shell_quote(text):
+    """ quote text in single quotes for bourne shell or csh """
+    return "'" + text.replace("'", "'\\''") + "'"
+
+def generate_shell_code(database=None, term=None, shell='bourne', depth=None):
+    """ Generate shell code which sets and exports LS_COLORS, like `dircolors -b` or
+    `dircolors -c`.
+
+    database is a .dircolors filename or text file object as accepted by
+    Dircolors.load_from_dircolors, or None for the built-in defaults.
+    term is matched against the TERM directives in the database, see load_from_dircolors.
+    shell is either 'bourne' or 'csh'.
+    depth converts colors to 256 or 16 colors, see Dircolors.depth. """
+    if shell not in _SHELL_FORMATS:
+        raise ValueError('shell must be one of %s, not %r'%(', '.join(_SHELL_FORMATS), shell))
+
+    dc = Dircolors(load=False, depth=depth)
+    if database is None:
+        database = StringIO(DEFAULT_DIRCOLORS)
+    dc.load_from_dircolors(database, term=term)
+    lscolors = _shell_quote(dc.generate_lscolors())
+
+    if shell == 'csh':
+        return 'setenv LS_COLORS %s\n'%lscolors
+    return 'LS_COLORS=%s;\nexport LS_COLORS\n'%lscolors
+
+def _cache_key(database, term, shell, depth=None):
+    """ Compute the cache key for a given set of arguments. Files are identified by
+    their path, inode, size and mtime so that the key can be computed with a single stat
+    and without reading the file. """
+    parts = [__version__, shell, term or '', str(depth or '')]
+    if database is not None:
+        statbuf = os.stat(database)
+        parts += [os.path.abspath(database), str(statbuf.st_dev), str(statbuf.st_ino),
+                  str(statbuf.st_size), str(statbuf.st_mtime_ns)]
+    # the key is written on the first line of the cache file, so no newlines allowed
+    return '\0'.join(parts).replace('\n', '\\n')
+
+def cached_shell_code(database=None, term=None, shell='bourne', cache_dir=None, depth=None):
+    """ Same as generate_shell_code, except database must be a filename or None, and the
+    result is cached in cache_dir (by default $XDG_CACHE_HOME/pydircolors).
+
+    The cache is keyed on the database file's identity and mtime, TERM, the shell and
+    the color depth, so a cache hit costs a stat and a single small file read.
+    Failure to write the cache is silently ignored. """
+    if cache_dir is None:
+        cache_dir = _cache_dir()
+    key = _cache_key(database, term, shell, depth)
+    # name cache files by a checksum of the key, and store the full key in the file to
+    # catch collisions
+    cache_file = os.path.join(cache_dir, '%08x'%zlib.crc32(key.encode('utf-8', 'surrogateescape')))
+
+    try:
+        with open(cache_file, 'r', encoding='utf-8', errors='surrogateescape') as file:
+            cached_key, _, code = file.read().partition('\n')
+        if cached_key == key:
+            return code
+    except OSError:
+        pass
+
+    code = generate_shell_code(database, term, shell, depth)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temporary file and rename so concurrent shells never see a partial file
+        tmp_file = '%s.%d.tmp'%(cache_file, os.getpid())
+        with open(tmp_file, 'w', encoding='utf-8', errors='surrogateescape') as file:
+            file.write(key + '\n' + code)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+    return code
+
+def _default_shell():
+    """ guess the shell format from $SHELL, like GNU dircolors """
+    shell = os.path.basename(os.environ.get('SHELL', ''))
+    return 'csh' if shell.endswith('csh') else 'bourne'
+
+def _parse_args_fast(argv):
+    """ Parse the common case of `[-b|-c] [--no-cache] [FILE]` without argparse, which
+    takes longer to import than the rest of this program takes to run from the cache.
+    Returns a tuple (shell, no_cache, file) or None if the slow parser is needed. """
+    shell, no_cache, file = None, False, None
+    for arg in argv:
+        if arg in ('-b', '--sh', '--bourne-shell') and shell is None:
+            shell = 'bourne'
+        elif arg in ('-c', '--csh', '--c-shell') and shell is None:
+            shell = 'csh'
+        elif arg == '--no-cache':
+            no_cache = True
+        elif arg and not arg.startswith('-') and file is None:
+            file = arg
+        else:
+            return None
+    return shell, no_cache, file
+
+def _parse_args(argv):
+    """ parse arguments with argparse, returns a namespace """
+    import argparse # pylint: disable=import-outside-toplevel
+    parser = argparse.ArgumentParser(prog='python -m dircolors',
+                                     description='Output shell code to set LS_COLORS, '
+                                                 'with caching for fast shell startup')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-b', '--sh', '--bourne-shell', dest='shell', action='store_const',
+                       const='bourne', help='output Bourne shell code to set LS_COLORS')
+    group.add_argument('-c', '--csh', '--c-shell', dest='shell', action='store_const',
+                       const='csh', help='output C shell code to set LS_COLORS')
+    group.add_argument('-p', '--print-database', action='store_true',
+                       help='output the default database')
+    parser.add_argument('--no-cache', action='store_true',
+                        help="don't read or write cached output")
+    parser.add_argument('--color-depth', type=int, choices=(256, 16), metavar='{256,16}',
+                        help='convert colors to the nearest of 256 or 16 colors')
+    parser.add_argument('file', nargs='?', metavar='FILE',
+                        help='.dircolors file to read instead of the built-in defaults')
+    args = parser.parse_args(argv)
+    if args.print_database and args.file:
+        parser.error('extra operand %s with --print-database'%args.file)
+    return args
+
+def main(argv=None):
+    """ dircolors main function """
+    if argv is None:
+        argv = sys.argv[1:]
+    fast_args = _parse_args_fast(argv)
+    depth = None
+    if fast_args is None:
+        args = _parse_args(argv)
+        if args.print_database:
+            sys.stdout.write(DEFAULT_DIRCOLORS.lstrip('\n'))
+            return 0
+        fast_args = args.shell, args.no_cache, args.file
+        depth = args.color_depth
+    shell, no_cache, file = fast_args
+
+    shell = shell or _default_shell()
+    # GNU dircolors treats an unset or empty TERM as "none"
+    term = os.environ.get('TERM') or 'none'
+    try:
+        if no_cache:
+            code = generate_shell_code(file, term, shell, depth)
+        else:
+            code = cached_shell_code(file, term, shell, depth=depth)
+    except (OSError, ValueError) as e:
+        print('dircolors: %s'%e, file=sys.stderr)
+        return 1
+    sys.stdout.write(code)
+    return 0
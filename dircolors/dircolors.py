@@ -14,7 +14,7 @@ import os
 import stat
 
 from ._defaults import DEFAULT_DIRCOLORS
-from ._util import *
+from .metadata import FilesystemMetadata
 
 __all__ = ['Dircolors']
 
@@ -48,18 +48,52 @@ def _init_code_map():
 _init_code_map()
 del _init_code_map
 
+# marker for keys that aren't in the base database, used by override layers
+_MISSING = object()
+
+def _parse_lscolors(lscolors):
+    """ Parse an LS_COLORS-format string in a single pass. Returns a tuple of two
+    OrderedDicts (codes, extensions). Items without '=' are ignored. """
+    codes = OrderedDict()
+    extensions = OrderedDict()
+    for item in lscolors.split(':'):
+        code, sep, color = item.partition('=')
+        if not sep:
+            continue # no key=value, just ignore
+        if code.startswith('*'):
+            extensions[code[1:]] = color
+        else:
+            codes[code] = color
+    return codes, extensions
+
 class Dircolors:
     """ Main dircolors class. Contains a database of formats corresponding to file types,
     modes, and extensions. Use the format() method to check a file and color it appropriately.
     """
-    def __init__(self, load=True):
+    def __init__(self, load=True, depth=None, metadata=None):
         """ Initialize a Dircolors object. If load=True (the default), then try
         to load dircolors info from the LS_COLORS environment variable.
         If no data is obtained from LS_COLORS, load the defaults.
-        If load=False, don't even load defaults. """
+        If load=False, don't even load defaults.
+        depth sets the color depth of the output, see the depth property.
+        metadata sets where format() gets file metadata from, see the metadata property. """
         self._loaded = False
+        self.metadata = metadata
         self._codes = OrderedDict()
         self._extensions = OrderedDict()
+        # the database converted to each color depth which has been used, depth -> (codes,
+        # extensions), and the tables for the current depth which are used for output
+        self._depth = None
+        self._depth_tables = {}
+        self._out_codes = self._codes
+        self._out_extensions = self._extensions
+        self.depth = depth
+        # override layers, name -> (codes, extensions), in order from bottom to top
+        self._layers = OrderedDict()
+        # base database values of keys overridden by a layer, or _MISSING if the key
+        # isn't in the base database, so they can be restored when the layer is removed
+        self._shadow_codes = {}
+        self._shadow_extensions = {}
         if load:
             if not self.load_from_environ():
                 self.load_defaults()
@@ -78,11 +112,73 @@ class Dircolors:
         """ return a boolean indicating whether some valid dircolors data has been loaded """
         return self._loaded
 
+    @property
+    def layers(self):
+        """ return a list of the names of the override layers, from bottom to top """
+        return list(self._layers)
+
+    @property
+    def metadata(self):
+        """ The metadata provider used by format() to look up file modes and symlink
+        targets, an instance of a dircolors.metadata.MetadataProvider subclass.
+        Setting it to None (the default) uses the live filesystem, FilesystemMetadata.
+        Use SnapshotMetadata to format files from a snapshot index instead. """
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, metadata):
+        self._metadata = FilesystemMetadata() if metadata is None else metadata
+
+    @property
+    def depth(self):
+        """ The color depth of formatted output and generate_lscolors(). None (the default)
+        outputs colors unchanged, 256 or 16 downconvert 24-bit colors (like '38;2;R;G;B')
+        and 256-colors (like '38;5;N') to the nearest color the terminal supports.
+
+        The database is converted once when it's loaded or the depth is first set, and
+        kept for each depth, so formatting costs the same at any depth. """
+        return self._depth
+
+    @depth.setter
+    def depth(self, depth):
+        if depth is not None:
+            # the palette tables take a while to build, only load them when a depth is used
+            from ._colordepth import DEPTHS # pylint: disable=import-outside-toplevel
+            if depth not in DEPTHS:
+                raise ValueError('depth must be None or one of %s, not %r'%(DEPTHS, depth))
+        self._depth = depth
+        self._select_depth()
+
+    def _select_depth(self):
+        """ point the output tables at the database converted to the current depth,
+        converting it if that hasn't been done yet """
+        if self._depth is None:
+            self._out_codes, self._out_extensions = self._codes, self._extensions
+            return
+        tables = self._depth_tables.get(self._depth)
+        if tables is None:
+            # lazy like in the depth setter
+            from ._colordepth import translate_table # pylint: disable=import-outside-toplevel
+            tables = (translate_table(self._codes, self._depth),
+                      translate_table(self._extensions, self._depth))
+            self._depth_tables[self._depth] = tables
+        self._out_codes, self._out_extensions = tables
+
+    def _reconvert(self):
+        """ drop the converted databases after loading a new base database, and convert
+        it to the current depth """
+        self._depth_tables.clear()
+        self._select_depth()
+
     def clear(self):
-        """ Clear the loaded data """
+        """ Clear the loaded data, including override layers """
         self._loaded = False
         self._codes.clear()
         self._extensions.clear()
+        self._layers.clear()
+        self._shadow_codes.clear()
+        self._shadow_extensions.clear()
+        self._reconvert()
 
     def load_from_lscolors(self, lscolors):
         """ Load the dircolors database from a string in the same format as the LS_COLORS
@@ -93,18 +189,10 @@ class Dircolors:
         if not lscolors:
             return False
 
-        for item in lscolors.split(':'):
-            try:
-                code, color = item.split('=', 1)
-            except ValueError:
-                continue # no key=value, just ignore
-            if code.startswith('*.'):
-                self._extensions[code[1:]] = color
-            else:
-                self._codes[code] = color
-
+        self._codes, self._extensions = _parse_lscolors(lscolors)
         if self._codes or self._extensions:
             self._loaded = True
+        self._reconvert()
         return self._loaded
 
     def load_from_environ(self, envvar='LS_COLORS'):
@@ -114,7 +202,7 @@ class Dircolors:
         envvar is unset). Regardless, the current database will be cleared. """
         return self.load_from_lscolors(os.environ.get(envvar))
 
-    def load_from_dircolors(self, database, strict=False):
+    def load_from_dircolors(self, database, strict=False, term=None):
         """ Load the dircolors database from a GNU-compatible .dircolors file.
         May raise any of the usual OSError exceptions if filename doesn't exist
         or otherwise can't be read.
@@ -126,6 +214,11 @@ class Dircolors:
         If strict is True, raise ValueError on the first unparsed line,
         otherwise invalid lines will be silently ignored.
 
+        If term is None (the default), TERM directives are ignored and every entry is
+        loaded. Otherwise term should be a terminal name (like the TERM environment variable)
+        and, like GNU dircolors, entries following a group of TERM lines are only loaded
+        if term matches one of that group's glob patterns.
+
         Returns a boolean indicating whether any data was loaded.
         The current database will always be cleared. """
         self.clear()
@@ -136,15 +229,22 @@ class Dircolors:
         else:
             raise ValueError('database must be str or io.TextIOBase, not %s'%type(database))
 
+        # TERM matching state, same as GNU dircolors: entries before the first TERM line
+        # are global, and a group of consecutive TERM lines enables the following entries
+        # if any of them matched.
+        term_state = 'global'
         try:
             for line in file:
-                # remove comments and skip empty lines
-                line = line.split('#')[0].strip()
-                if not line:
+                # remove comments and skip empty lines. Like GNU dircolors, a comment starts
+                # at the keyword or at any '#' after it, so suffixes like '*#' still work
+                split = line.split(None, 1)
+                if not split or split[0].startswith('#'):
                     continue
+                line = line.strip()
+                if len(split) == 2:
+                    split[1:] = split[1].split('#', 1)[0].split()
 
                 # make sure there's two space-separated fields
-                split = line.split()
                 if len(split) != 2:
                     if strict:
                         raise ValueError('Warning: unable to parse dircolors line "%s"'%line)
@@ -152,11 +252,23 @@ class Dircolors:
 
                 key, val = split
                 if key == 'TERM':
-                    continue # ignore TERM directives
-                elif key in _CODE_MAP:
+                    if term is not None and term_state != 'sure':
+                        # fnmatch imports re, which would slow down every shell startup
+                        from fnmatch import fnmatchcase # pylint: disable=import-outside-toplevel
+                        term_state = 'sure' if fnmatchcase(term, val) else 'no'
+                    continue
+                if term_state == 'sure':
+                    term_state = 'yes'
+                elif term_state == 'no':
+                    continue
+
+                if key in _CODE_MAP:
                     self._codes[_CODE_MAP[key]] = val
                 elif key.startswith('.'):
                     self._extensions[key] = val
+                elif key.startswith('*'):
+                    # GNU dircolors also allows arbitrary suffixes like '*~'
+                    self._extensions[key[1:]] = val
                 elif strict:
                     raise ValueError('Warning: unable to parse dircolors line "%s"'%line)
                 # elif not strict, skip
@@ -166,6 +278,76 @@ class Dircolors:
             return self._loaded
         finally:
             file.close()
+            # also when a strict load fails part way, so the converted tables always
+            # match the base database
+            self._reconvert()
+
+    def add_layer(self, name, lscolors):
+        """ Add an override layer on top of the loaded database. The layer is parsed from
+        a string in the same format as the LS_COLORS environment variable, and its entries
+        take precedence over the base database and any lower layers.
+
+        If a layer called `name` already exists, it is replaced and moved to the top.
+        Only the entries mentioned by the new (and replaced) layer are updated, so adding
+        a small layer is cheap regardless of the size of the base database.
+        Loading a new base database with any of the load functions removes all layers.
+
+        Returns a boolean indicating whether any data is loaded. """
+        old_layer = self._layers.pop(name, None)
+        codes, extensions = _parse_lscolors(lscolors or '')
+        self._layers[name] = (codes, extensions)
+
+        changed_codes = set(codes)
+        changed_extensions = set(extensions)
+        if old_layer is not None:
+            changed_codes.update(old_layer[0])
+            changed_extensions.update(old_layer[1])
+        self._update_layered(changed_codes, changed_extensions)
+        return self._loaded
+
+    def remove_layer(self, name):
+        """ Remove the override layer called `name`, restoring the entries it overrode
+        from the base database or lower layers. Only the layer's own entries are updated.
+        Raises KeyError if there's no such layer.
+        Returns a boolean indicating whether any data is loaded. """
+        codes, extensions = self._layers.pop(name)
+        self._update_layered(codes, extensions)
+        return self._loaded
+
+    def _update_layered(self, codes, extensions):
+        """ recompute the value of the given code and extension keys from the base
+        database and the current layers """
+        for table, shadow, index, keys in ((self._codes, self._shadow_codes, 0, codes),
+                                           (self._extensions, self._shadow_extensions, 1,
+                                            extensions)):
+            for key in keys:
+                # if no layer has overridden this key yet, the current value is the base one
+                if key not in shadow:
+                    shadow[key] = table.get(key, _MISSING)
+                for layer in reversed(self._layers.values()):
+                    if key in layer[index]:
+                        table[key] = layer[index][key]
+                        break
+                else:
+                    # no layer overrides this key any more, restore the base value
+                    base = shadow.pop(key)
+                    if base is _MISSING:
+                        table.pop(key, None)
+                    else:
+                        table[key] = base
+
+        # update only the same keys in the converted databases
+        for depth, depth_tables in self._depth_tables.items():
+            # only reached once a depth is used, which has already imported this
+            from ._colordepth import convert_sgr # pylint: disable=import-outside-toplevel
+            for table, depth_table, keys in ((self._codes, depth_tables[0], codes),
+                                             (self._extensions, depth_tables[1], extensions)):
+                for key in keys:
+                    if key in table:
+                        depth_table[key] = convert_sgr(table[key], depth)
+                    else:
+                        depth_table.pop(key, None)
+        self._loaded = bool(self._codes or self._extensions)
 
     def load_defaults(self):
         """ Load the default database. """
@@ -173,14 +355,15 @@ class Dircolors:
         return self.load_from_dircolors(StringIO(DEFAULT_DIRCOLORS), True)
 
     def generate_lscolors(self):
-        """ Output the database in the format used by the LS_COLORS environment variable. """
+        """ Output the database in the format used by the LS_COLORS environment variable,
+        converted to the current color depth. """
         if not self._loaded:
             return ''
 
         def gen_pairs():
-            for pair in self._codes.items():
+            for pair in self._out_codes.items():
                 yield pair
-            for pair in self._extensions.items():
+            for pair in self._out_extensions.items():
                 # change .xyz to *.xyz
                 yield '*' + pair[0], pair[1]
 
@@ -189,18 +372,18 @@ class Dircolors:
     def _format_code(self, text, code):
         """ format text with an lscolors code. Return text unmodified if code
         isn't found in the database """
-        val = self._codes.get(code, None)
+        val = self._out_codes.get(code, None)
         if val:
-            return '\033[%sm%s\033[%sm'%(val, text, self._codes.get('rs', '0'))
+            return '\033[%sm%s\033[%sm'%(val, text, self._out_codes.get('rs', '0'))
         return text
 
     def _format_ext(self, text, ext):
         """ Format text according to the given file extension.
         ext must have a leading '.'
         text need not actually end in '.ext' """
-        val = self._extensions.get(ext, '0')
+        val = self._out_extensions.get(ext, None)
         if val:
-            return '\033[%sm%s\033[%sm'%(val, text, self._codes.get('rs', '0'))
+            return '\033[%sm%s\033[%sm'%(val, text, self._out_codes.get('rs', '0'))
         return text
 
     def format_mode(self, text, mode):
@@ -270,6 +453,10 @@ class Dircolors:
         to which `file` is looked up, or an integer representing a directory
         descriptor (usually from `os.open()`).
 
+        File modes and symlink targets come from the metadata provider, see the metadata
+        property. With a snapshot, file and cwd are paths within the snapshot and
+        directory descriptors aren't supported.
+
         Use follow_symlinks to dereference symlinks entirely.
         Use show_target=True with follow_symlinks=False to format both the link name
         and its target in the format:
@@ -285,15 +472,15 @@ class Dircolors:
             return file
 
         try:
-            statbuf = stat_at(file, cwd, follow_symlinks)
+            mode = self._metadata.mode(file, cwd, follow_symlinks)
         except OSError as e:
             return '%s [Error stat-ing: %s]'%(file, e.strerror)
 
-        mode = statbuf.st_mode
         if (not follow_symlinks) and show_target and stat.S_ISLNK(mode):
-            target_path = readlink_at(file, cwd)
+            target_path = self._metadata.readlink(file, cwd)
             if cwd is None:
-                link_dir = os.path.dirname(file.rstrip('/'))
+                # a link in the current directory has no dirname, use cwd=None for that too
+                link_dir = os.path.dirname(file.rstrip('/')) or None
             elif isinstance(cwd, str):
                 link_dir = os.path.dirname(os.path.join(cwd, file).rstrip('/'))
             elif isinstance(cwd, int):
@@ -302,7 +489,7 @@ class Dircolors:
                 cwd_dir = os.readlink('/proc/self/fd/%d'%cwd)
                 link_dir = os.path.dirname(os.path.join(cwd_dir, file).rstrip('/'))
             try:
-                stat_at(target_path, link_dir) # check for broken link
+                self._metadata.mode(target_path, link_dir) # check for broken link
                 target = self.format(target_path, link_dir, False, False)
             except OSError:
                 # format as "orphan"
@@ -310,3 +497,25 @@ class Dircolors:
             return self._format_code(file, 'ln') + ' -> ' + target
 
         return self.format_mode(file, mode)
+
+    def format_archive(self, archive, show_target=False):
+        """ Generator which formats and colors each member of a tar or zip archive, in the
+        order they're stored, without extracting anything or touching the filesystem.
+
+        `archive` can be a filename or a binary file object. Tar archives (including
+        compressed ones) are streamed in a single pass using constant memory, so they
+        can be read from a pipe. Zip archives must be seekable.
+
+        Members are formatted with format_mode() using the type and permission bits stored
+        in the archive. With show_target=True, symlinks are followed by ' -> target' and
+        hard links by ' link to target', where the target is shown uncolored since its
+        type isn't known without scanning the rest of the archive.
+
+        Raises ValueError if archive isn't a tar or zip file. """
+        # tarfile and zipfile take longer to import than the rest of this package
+        from ._archive import iter_archive # pylint: disable=import-outside-toplevel
+        for member in iter_archive(archive):
+            text = self.format_mode(member.name, member.mode)
+            if show_target and member.target is not None:
+                text += (' link to ' if member.hardlink else ' -> ') + member.target
+            yield text
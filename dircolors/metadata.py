@@ -0,0 +1,259 @@
+# Metadata providers for pydircolors
+#
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+
+""" Sources of file metadata for Dircolors.format(). FilesystemMetadata looks at the live
+filesystem, and SnapshotMetadata reads a snapshot index written by write_snapshot(), so that
+listings of backups or remote hosts can be colored without access to the files themselves. """
+
+import abc
+import errno
+import os
+import stat
+
+from ._util import readlink_at, stat_at
+
+__all__ = ['MetadataProvider', 'FilesystemMetadata', 'SnapshotMetadata', 'write_snapshot']
+
+# version of the snapshot index schema
+_SNAPSHOT_VERSION = '1'
+# same limit as Linux, for following symlinks in snapshots
+_MAX_SYMLINKS = 40
+# marker for directories being resolved, to detect symlink loops
+_RESOLVING = object()
+
+def _oserror(code, path):
+    """ build an OSError like the ones os.stat raises """
+    return OSError(code, os.strerror(code), path)
+
+def _above(path):
+    """ check whether a normalized relative path starts with '..' """
+    return path == os.pardir or path.startswith(os.pardir + os.sep)
+
+# abc.ABC would need python 3.4
+class MetadataProvider(metaclass=abc.ABCMeta):
+    """ Abstract base class for metadata providers. Subclasses must implement mode(),
+    readlink() and listdir() for paths relative to a directory `cwd`, which is a string or
+    None, and should raise OSError for missing files like their os module equivalents.
+    They're also usable as context managers which call close(). """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @abc.abstractmethod
+    def mode(self, file, cwd=None, follow_symlinks=False):
+        """ return the st_mode of file """
+
+    @abc.abstractmethod
+    def readlink(self, file, cwd=None):
+        """ return the target of the symlink file """
+
+    @abc.abstractmethod
+    def listdir(self, dirname):
+        """ return an iterable of the names in directory dirname, in directory order """
+
+    def close(self):
+        """ release any resources held by this provider """
+
+class FilesystemMetadata(MetadataProvider):
+    """ Metadata from the live filesystem. cwd may also be an integer directory descriptor. """
+    def mode(self, file, cwd=None, follow_symlinks=False):
+        return stat_at(file, cwd, follow_symlinks).st_mode
+
+    def readlink(self, file, cwd=None):
+        return readlink_at(file, cwd)
+
+    def listdir(self, dirname):
+        """ Generator yielding the names in dirname without reading the whole directory
+        up front where possible """
+        scandir = getattr(os, 'scandir', None)
+        if scandir is None:
+            # python < 3.5
+            yield from os.listdir(dirname)
+            return
+        for entry in scandir(dirname):
+            yield entry.name
+
+class SnapshotMetadata(MetadataProvider):
+    """ Metadata from a snapshot index written by write_snapshot(). The index stores each
+    entry's mode and symlink target, and is looked up with paths relative to the snapshot's
+    root directory. Absolute paths (including symlink targets), and relative paths going
+    above the root, are looked up relative to the root if they lead under the directory the
+    snapshot was taken from, and don't exist otherwise. Paths are resolved lexically, so
+    '..' after a symlinked directory isn't followed like the kernel would.
+
+    Raises OSError if index_file can't be opened, or ValueError if it isn't a snapshot index. """
+    def __init__(self, index_file):
+        # sqlite3 is only needed for snapshots, don't load it for every Dircolors
+        import sqlite3 # pylint: disable=import-outside-toplevel
+        if not os.path.isfile(index_file):
+            raise _oserror(errno.ENOENT, index_file)
+        self._db = sqlite3.connect(index_file)
+        try:
+            info = dict(self._db.execute('SELECT key, value FROM info'))
+        except sqlite3.DatabaseError as e:
+            self._db.close()
+            raise ValueError('%s is not a snapshot index'%index_file) from e
+        if info.get('version') != _SNAPSHOT_VERSION:
+            self._db.close()
+            raise ValueError('%s: unsupported snapshot version %r'%(index_file,
+                                                                   info.get('version')))
+        self.root = info.get('root')
+        # the entries of the most recently listed directory, since listings look up
+        # every entry of a directory one at a time right after listing it
+        self._dir_cache = (None, {})
+        # resolved paths of directories containing symlinks, see _real_dir()
+        self._real_dirs = {}
+
+    def close(self):
+        self._db.close()
+
+    def _relpath(self, file, cwd=None):
+        """ normalize file, relative to cwd, to a path relative to the snapshot root """
+        if cwd is not None and not isinstance(cwd, str):
+            raise ValueError('snapshot paths must be str, not %s'%type(cwd))
+        path = os.path.normpath(os.path.join(cwd or '', file))
+        if os.path.isabs(path) or _above(path):
+            # absolute paths, and relative ones which go above the root and maybe come back,
+            # are resolved against the directory the snapshot was taken from
+            if self.root is None:
+                raise _oserror(errno.ENOENT, file)
+            path = os.path.relpath(os.path.join(self.root, path), self.root)
+            if _above(path):
+                raise _oserror(errno.ENOENT, file)
+        return path
+
+    def _lookup(self, path):
+        """ return the (mode, target) record of a path from _relpath(), or raise OSError """
+        if path == os.curdir:
+            parent, name = b'', os.fsencode(path) # the root itself
+        else:
+            parent, name = os.path.split(path)
+            parent = self._real_dir(parent) if parent else os.curdir
+            parent, name = os.fsencode(parent), os.fsencode(name)
+        cached_parent, records = self._dir_cache
+        if parent == cached_parent:
+            record = records.get(name)
+        else:
+            record = self._db.execute('SELECT mode, target FROM entries '
+                                      'WHERE parent = ? AND name = ?', (parent, name)).fetchone()
+        if record is None:
+            raise _oserror(errno.ENOENT, path)
+        return record
+
+    def _resolve(self, path):
+        """ follow symlinks from a path from _relpath(), returns a tuple (path, mode)
+        of the final target """
+        mode, target = self._lookup(path)
+        links = 0
+        while stat.S_ISLNK(mode):
+            links += 1
+            if links > _MAX_SYMLINKS:
+                raise _oserror(errno.ELOOP, path)
+            path = self._relpath(os.fsdecode(target), os.path.dirname(path))
+            mode, target = self._lookup(path)
+        return path, mode
+
+    def _real_dir(self, path):
+        """ resolve symlinks in the directory path, cached since snapshots never change """
+        real = self._real_dirs.get(path)
+        if real is _RESOLVING:
+            # a symlink loop through parent directories
+            raise _oserror(errno.ELOOP, path)
+        if real is None:
+            self._real_dirs[path] = _RESOLVING
+            try:
+                real, mode = self._resolve(path)
+                if not stat.S_ISDIR(mode):
+                    raise _oserror(errno.ENOTDIR, path)
+            except OSError:
+                del self._real_dirs[path]
+                raise
+            self._real_dirs[path] = real
+        return real
+
+    def mode(self, file, cwd=None, follow_symlinks=False):
+        path = self._relpath(file, cwd)
+        if follow_symlinks:
+            return self._resolve(path)[1]
+        return self._lookup(path)[0]
+
+    def readlink(self, file, cwd=None):
+        mode, target = self._lookup(self._relpath(file, cwd))
+        if not stat.S_ISLNK(mode):
+            raise _oserror(errno.EINVAL, file)
+        return os.fsdecode(target)
+
+    def listdir(self, dirname):
+        parent = os.fsencode(self._real_dir(self._relpath(dirname)))
+        records = {}
+        for name, mode, target in self._db.execute('SELECT name, mode, target FROM entries '
+                                                   'WHERE parent = ?', (parent,)):
+            records[name] = (mode, target)
+        self._dir_cache = (parent, records)
+        return [os.fsdecode(name) for name in records]
+
+def _walk_records(root, skip=()):
+    """ generator of (parent, name, mode, target) rows for write_snapshot, with paths
+    relative to root encoded as bytes. Files whose (st_dev, st_ino) is in skip are left out. """
+    yield b'', os.fsencode(os.curdir), os.stat(root).st_mode, None
+    for dirpath, dirnames, filenames in os.walk(root):
+        parent = os.fsencode(os.path.relpath(dirpath, root))
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.lstat(path)
+                target = os.fsencode(os.readlink(path)) if stat.S_ISLNK(st.st_mode) else None
+            except OSError:
+                continue # removed while walking
+            if (st.st_dev, st.st_ino) not in skip:
+                yield parent, os.fsencode(name), st.st_mode, target
+
+def _write_index(db_file, root):
+    """ create the snapshot database db_file with the entries under root, returns the
+    number of entries """
+    import sqlite3 # pylint: disable=import-outside-toplevel
+    db = sqlite3.connect(db_file)
+    try:
+        # db_file may be inside root, keep the journal in memory so that it's the only file
+        # created there, and leave it out of the snapshot
+        db.execute('PRAGMA journal_mode = MEMORY')
+        db.execute('CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT)')
+        db.execute('CREATE TABLE entries (parent BLOB, name BLOB, mode INTEGER NOT NULL, '
+                   'target BLOB, PRIMARY KEY (parent, name)) WITHOUT ROWID')
+        db.executemany('INSERT INTO info VALUES (?, ?)',
+                       [('version', _SNAPSHOT_VERSION), ('root', os.path.abspath(root))])
+        db.commit()
+        db_stat = os.stat(db_file)
+        count = db.executemany('INSERT INTO entries VALUES (?, ?, ?, ?)',
+                               _walk_records(root, {(db_stat.st_dev, db_stat.st_ino)})).rowcount
+        db.commit()
+    finally:
+        db.close()
+    return count
+
+def write_snapshot(index_file, root):
+    """ Walk the directory root, without following symlinks, and write the mode and symlink
+    target of every entry to a snapshot index file (an SQLite database) which can be
+    opened with SnapshotMetadata. Unreadable directories are skipped.
+    The index is written to a temporary file and renamed, so an existing index_file stays
+    valid until the new one is complete. Returns the number of entries written.
+
+    Raises OSError if root isn't a directory or index_file can't be written. """
+    import sqlite3 # pylint: disable=import-outside-toplevel
+    if not stat.S_ISDIR(os.stat(root).st_mode):
+        raise _oserror(errno.ENOTDIR, root)
+    tmp_file = '%s.%d.tmp'%(index_file, os.getpid())
+    try:
+        count = _write_index(tmp_file, root)
+        os.replace(tmp_file, index_file)
+    except sqlite3.Error as e:
+        raise OSError('cannot write snapshot index %s: %s'%(index_file, e)) from e
+    finally:
+        # only still there if something failed
+        if os.path.exists(tmp_file):
+            os.unlink(tmp_file)
+    return count
@@ -0,0 +1,96 @@
+# pyls - a simple implementation of `ls` used to test python-dircolors
+#
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+
+""" multi-column output layout for pyls, using the same algorithm as GNU ls """
+
+import unicodedata
+
+__all__ = ['display_width', 'calculate_columns', 'format_columns']
+
+# the narrowest possible column, one character plus two spaces of separation
+_MIN_COLUMN_WIDTH = 3
+
+def _char_width(char):
+    """ terminal display width of a single character """
+    if unicodedata.combining(char) or unicodedata.category(char) in ('Mn', 'Me', 'Cf'):
+        return 0
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return 2
+    return 1
+
+def display_width(text):
+    """ Return the number of terminal cells needed to display text, which must not contain
+    escape sequences. East Asian wide and fullwidth characters take two cells,
+    combining and other zero-width characters take none. """
+    try:
+        # fast path, ASCII is always one cell per character
+        text.encode('ascii')
+        return len(text)
+    except UnicodeEncodeError:
+        return sum(_char_width(char) for char in text)
+
+def calculate_columns(widths, line_width, by_columns=True):
+    """ Find the largest number of columns that fit widths (a list of display widths of
+    each entry) into line_width terminal cells, with two spaces between columns.
+    by_columns selects the layout, sorted down columns like `ls -C` if True, or across
+    rows like `ls -x` if False.
+
+    Returns a tuple (ncols, column_widths), where column_widths includes separator spacing
+    for all but the last column. Like GNU ls, every candidate column count is tracked in
+    a single pass over the entries, so this is O(n * line_width / 3). """
+    count = len(widths)
+    max_cols = max(1, min(line_width // _MIN_COLUMN_WIDTH, count))
+
+    # per candidate column count (index + 1): whether it still fits, its total line
+    # length, and the width of each of its columns
+    valid = [True] * max_cols
+    line_lens = [(i + 1) * _MIN_COLUMN_WIDTH for i in range(max_cols)]
+    col_widths = [[_MIN_COLUMN_WIDTH] * (i + 1) for i in range(max_cols)]
+
+    for fileno, width in enumerate(widths):
+        for i in range(max_cols):
+            if not valid[i]:
+                continue
+            if by_columns:
+                idx = fileno // ((count + i) // (i + 1))
+            else:
+                idx = fileno % (i + 1)
+            real_width = width + (0 if idx == i else 2)
+            cols = col_widths[i]
+            if cols[idx] < real_width:
+                line_lens[i] += real_width - cols[idx]
+                cols[idx] = real_width
+                valid[i] = line_lens[i] < line_width
+
+    ncols = max_cols
+    while ncols > 1 and not valid[ncols - 1]:
+        ncols -= 1
+    return ncols, col_widths[ncols - 1]
+
+def format_columns(entries, line_width, by_columns=True):
+    """ Lay out entries, a list of (text, width) tuples where text may contain escape
+    sequences and width is its precomputed display width, into columns.
+    Returns a list of output lines. """
+    if not entries:
+        return []
+    ncols, col_widths = calculate_columns([width for _, width in entries], line_width, by_columns)
+    count = len(entries)
+    nrows = (count + ncols - 1) // ncols
+
+    lines = []
+    for row in range(nrows):
+        if by_columns:
+            indexes = range(row, count, nrows)
+        else:
+            indexes = range(row * ncols, min((row + 1) * ncols, count))
+        parts = []
+        for col, idx in enumerate(indexes):
+            text, width = entries[idx]
+            parts.append(text)
+            parts.append(' ' * (col_widths[col] - width))
+        # no padding after the last entry on each line
+        parts.pop()
+        lines.append(''.join(parts))
+    return lines
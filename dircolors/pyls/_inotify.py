@@ -0,0 +1,101 @@
+# pyls - a simple implementation of `ls` used to test python-dircolors
+#
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+
+""" minimal Linux inotify bindings using ctypes, used by pyls --watch """
+
+from collections import namedtuple
+import ctypes
+import ctypes.util
+import functools
+import os
+import struct
+
+__all__ = ['Inotify', 'InotifyEvent']
+
+# event masks from <sys/inotify.h>
+# pylint: disable=bad-whitespace
+IN_ATTRIB       = 0x00000004
+IN_MOVED_FROM   = 0x00000040
+IN_MOVED_TO     = 0x00000080
+IN_CREATE       = 0x00000100
+IN_DELETE       = 0x00000200
+IN_DELETE_SELF  = 0x00000400
+IN_MOVE_SELF    = 0x00000800
+IN_Q_OVERFLOW   = 0x00004000
+IN_IGNORED      = 0x00008000
+IN_ONLYDIR      = 0x01000000
+IN_CLOEXEC      = 0o2000000
+# pylint: enable=bad-whitespace
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_STRUCT = struct.Struct('iIII')
+# enough for at least one event with the longest possible name
+_READ_SIZE = 64 * (_EVENT_STRUCT.size + 256)
+
+InotifyEvent = namedtuple('InotifyEvent', ['wd', 'mask', 'cookie', 'name'])
+
+@functools.lru_cache(maxsize=None)
+def _get_libc():
+    """ load libc and set up the inotify function prototypes on first use """
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    try:
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except AttributeError as e:
+        raise OSError('inotify is not supported on this platform') from e
+    return libc
+
+def _check(ret):
+    """ raise OSError from errno if a libc call returned -1 """
+    if ret == -1:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return ret
+
+class Inotify:
+    """ An inotify instance. Add watches with add_watch(), then call read_events() to block
+    until events are available. Also usable as a context manager which closes the fd. """
+    def __init__(self):
+        self._libc = _get_libc()
+        self._fd = _check(self._libc.inotify_init1(IN_CLOEXEC))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def fileno(self):
+        """ return the inotify file descriptor, e.g. for use with select() """
+        return self._fd
+
+    def close(self):
+        """ close the inotify fd, removing all watches """
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def add_watch(self, path, mask):
+        """ watch path for the events in mask, returns the watch descriptor """
+        return _check(self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask))
+
+    def rm_watch(self, wd):
+        """ remove a watch descriptor returned by add_watch """
+        _check(self._libc.inotify_rm_watch(self._fd, wd))
+
+    def read_events(self):
+        """ block until events are available and return a list of InotifyEvent tuples.
+        name is a str, or None for events on the watched path itself """
+        buf = os.read(self._fd, _READ_SIZE)
+        events = []
+        offset = 0
+        while offset < len(buf):
+            wd, mask, cookie, length = _EVENT_STRUCT.unpack_from(buf, offset)
+            offset += _EVENT_STRUCT.size
+            name = buf[offset:offset+length].rstrip(b'\0')
+            offset += length
+            events.append(InotifyEvent(wd, mask, cookie, os.fsdecode(name) if name else None))
+        return events
@@ -0,0 +1,95 @@
+# pyls - a simple implementation of `ls` used to test python-dircolors
+#
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+
+""" sort keys for pyls, matching GNU ls name (locale collation) and version ordering.
+Keys are computed once per entry, so sorting never does expensive work per comparison. """
+
+import locale
+import re
+
+__all__ = ['locale_key', 'version_key', 'sort_names', 'SORT_KEYS']
+
+# file suffixes which are compared separately in version sort, like GNU filevercmp
+_SUFFIX_RE = re.compile(r'(.*?)((?:\.[A-Za-z~][A-Za-z0-9~]*)*)$', re.DOTALL)
+_DIGITS_RE = re.compile(r'[0-9]+')
+
+def locale_key(name):
+    """ sort key collating name according to the current LC_COLLATE locale, like strcoll """
+    try:
+        return locale.strxfrm(name)
+    except (ValueError, UnicodeError):
+        # e.g. undecodable file names with surrogate escapes
+        return name
+
+# Version keys are strings whose plain comparison matches GNU verrevcmp, where each
+# character or run of digits maps to a token. In increasing order, tokens are:
+# '~', a run of zeros followed by '~', the end of the string, a run of digits (which
+# compares as 0 against characters), letters, then all other characters.
+_TILDE = '\x01'
+_ZERO_TILDE = '\x02'
+_END = '\x03'
+_NUMBER = '\x04'
+
+class _CharOrder(dict):
+    """ str.translate table mapping characters to their version sort weight, filled in
+    lazily for non-ASCII characters """
+    def __missing__(self, codepoint):
+        # non-letters sort after letters, in codepoint order
+        char = chr(min(codepoint + 256, 0x10ffff))
+        self[codepoint] = char
+        return char
+
+_CHAR_ORDER = _CharOrder((ord(c), c) for c in
+                         '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')
+_CHAR_ORDER[ord('~')] = _TILDE
+
+def _encode_number(match):
+    """ re.sub callback encoding a run of digits as its length then its digits, without
+    leading zeros, so that runs compare numerically.
+
+    verrevcmp skips a run of zeros when comparing it against the end of the other string,
+    so the run compares like whatever follows it. A trailing run of zeros is dropped, and
+    one followed by '~' (the only thing sorting before the end) gets a special token. """
+    digits = match.group().lstrip('0')
+    if not digits:
+        following = match.string[match.end():match.end() + 1]
+        if not following:
+            return ''
+        if following == _TILDE:
+            return _ZERO_TILDE
+    return _NUMBER + chr(0x20 + len(digits)) + digits
+
+def _verrev_key(text):
+    """ key string whose comparison is equivalent to GNU verrevcmp """
+    return _DIGITS_RE.sub(_encode_number, text.translate(_CHAR_ORDER)) + _END
+
+def version_key(name):
+    """ Sort key for natural version ordering, matching `ls -v` (GNU filevercmp, with
+    ties broken by plain string comparison). '.' and '..' come first, then other dotfiles.
+    File suffixes like '.tar.gz' are ignored unless the rest of the names are equal. """
+    if name == '.':
+        dot = 0
+    elif name == '..':
+        dot = 1
+    elif name.startswith('.'):
+        dot = 2
+    else:
+        dot = 3
+    full_key = _verrev_key(name)
+    prefix = _SUFFIX_RE.match(name).group(1) if '.' in name else name
+    prefix_key = full_key if prefix == name else _verrev_key(prefix)
+    return (dot, prefix_key, full_key, name)
+
+SORT_KEYS = {
+    'name': locale_key,
+    'version': version_key,
+}
+
+def sort_names(names, sort='name'):
+    """ Sort a list of names in place by one of the SORT_KEYS, or leave them alone
+    if sort is 'none'. Returns names. """
+    if sort != 'none':
+        names.sort(key=SORT_KEYS[sort])
+    return names
@@ -6,32 +6,317 @@
 """ pyls - a simple implementation of `ls` used to test python-dircolors """
 
 import argparse
+from collections import defaultdict
+import locale
 import os
+import stat
 import sys
 
 from ..dircolors import Dircolors
+from ..metadata import FilesystemMetadata, SnapshotMetadata, write_snapshot
+from . import _inotify
+from ._columns import display_width, format_columns
+from ._sort import SORT_KEYS, sort_names
 
-def main():
-    """ pyls main function """
+# inotify events which can change how a directory entry is listed
+_WATCH_MASK = (_inotify.IN_CREATE | _inotify.IN_DELETE | _inotify.IN_MOVED_FROM |
+               _inotify.IN_MOVED_TO | _inotify.IN_ATTRIB | _inotify.IN_DELETE_SELF |
+               _inotify.IN_MOVE_SELF | _inotify.IN_ONLYDIR)
+
+def list_archives(dc, files):
+    """ print the colorized members of each archive in files. Returns False if any of
+    them couldn't be read completely, True otherwise. """
     # pylint: disable=invalid-name
-    parser = argparse.ArgumentParser(prog='pyls', description='Python implementation of the "ls" command for testing dircolors')
-    parser.add_argument('files', nargs='*', metavar='FILE', help='File or directories to list')
-    args = parser.parse_args()
+    ok = True
+    for f in files:
+        if len(files) > 1:
+            print(f + ':')
+        try:
+            if f == '-':
+                for line in dc.format_archive(sys.stdin.buffer, show_target=True):
+                    print(line)
+            else:
+                for line in dc.format_archive(f, show_target=True):
+                    print(line)
+        except (OSError, ValueError) as e:
+            sys.stdout.flush()
+            print('%s: error: %s'%(f, e), file=sys.stderr)
+            ok = False
+        if len(files) > 1:
+            print()
+    return ok
+
+def _line_width():
+    """ get the output width for multi-column output like GNU ls: from $COLUMNS,
+    then the terminal size, falling back to 80 """
+    try:
+        width = int(os.environ.get('COLUMNS', ''))
+        if width > 0:
+            return width
+    except ValueError:
+        pass
+    try:
+        return os.get_terminal_size(sys.stdout.fileno()).columns
+    except (AttributeError, ValueError, OSError):
+        return 80
+
+def _is_dir(metadata, path):
+    """ check whether path is a directory and not a symlink, according to metadata """
+    try:
+        return stat.S_ISDIR(metadata.mode(path))
+    except OSError:
+        return False
+
+def iter_dir(dirname, sort='name', limit=None, metadata=None, on_unsorted=None):
+    """ Generator yielding the names in dirname sorted by one of the _sort.SORT_KEYS, or
+    in directory order if sort is 'none'. Sort keys are computed once per entry.
+    Names are listed from metadata, a dircolors.metadata provider, or the live
+    filesystem if None.
+
+    If limit is given and dirname has more than limit entries, sorting is abandoned and
+    the entries are streamed in directory order instead, so that huge directories can be
+    listed without reading them entirely into memory first. When that happens,
+    on_unsorted is called with no arguments before the first entry is yielded. """
+    if metadata is None:
+        metadata = FilesystemMetadata()
+    names = iter(metadata.listdir(dirname))
+    if sort == 'none':
+        yield from names
+        return
+
+    batch = []
+    for name in names:
+        if limit is not None and len(batch) >= limit:
+            if on_unsorted is not None:
+                on_unsorted()
+            yield from batch
+            yield name
+            yield from names
+            return
+        batch.append(name)
+    yield from sort_names(batch, sort)
+
+def column_entries(dc, names, dirname=None):
+    """ Format names for multi-column output. Returns a list of (text, width) tuples,
+    where the display width is computed once from the uncolored text. """
+    entries = []
+    for name in names:
+        text = dc.format(name, dirname)
+        # errors are appended to the name uncolored, measure those in full
+        entries.append((text, display_width(name if '\033' in text else text)))
+    return entries
+
+def list_dir(dc, dirname):
+    """ return a dict mapping each name in dirname to its formatted listing """
+    return dict((name, dc.format(name, dirname, show_target=True))
+                for name in os.listdir(dirname))
+
+def update_entries(dc, dirname, entries, names, sort='name'):
+    """ Re-stat and re-format only the given names in dirname, updating the entries dict
+    from list_dir() in place. Returns a list of lines describing what changed:
+    '+ entry' for new entries, '* entry' for changed ones, and '- name' for removed ones.
+    Entries which were touched but still format the same aren't reported. """
+    changes = []
+    for name in sort_names(list(names), sort):
+        if os.path.lexists(os.path.join(dirname, name)):
+            text = dc.format(name, dirname, show_target=True)
+            old = entries.get(name)
+            if text != old:
+                entries[name] = text
+                changes.append(('+ ' if old is None else '* ') + text)
+        elif entries.pop(name, None) is not None:
+            changes.append('- ' + name)
+    return changes
+
+def watch_dirs(dc, dirs, sort='name'):
+    """ List each directory in dirs, then wait for inotify events and print incremental
+    updates for the entries which were created, deleted, renamed, or had their
+    attributes changed. Runs until all directories are gone or interrupted. """
+    # pylint: disable=invalid-name
+    with _inotify.Inotify() as inotify:
+        watches = {}
+        entries = {}
+        for d in dirs:
+            watches[inotify.add_watch(d, _WATCH_MASK)] = d
+            entries[d] = list_dir(dc, d)
+            if len(dirs) > 1:
+                print(dc.format(d) + ':')
+            for name in sort_names(list(entries[d]), sort):
+                print(entries[d][name])
+            print()
+        sys.stdout.flush()
 
-    files = args.files
-    if not files:
-        files = ['.']
+        while watches:
+            changed = defaultdict(set)
+            for event in inotify.read_events():
+                if event.mask & _inotify.IN_Q_OVERFLOW:
+                    # events were lost, fall back to comparing against a full listing
+                    for d in watches.values():
+                        changed[d].update(os.listdir(d))
+                        changed[d].update(entries[d])
+                    continue
+                d = watches.get(event.wd)
+                if d is None:
+                    continue
+                if event.mask & (_inotify.IN_DELETE_SELF | _inotify.IN_MOVE_SELF |
+                                 _inotify.IN_IGNORED):
+                    print('%s: directory was removed or moved, no longer watching'%d)
+                    del watches[event.wd]
+                    changed.pop(d, None)
+                elif event.name is not None:
+                    changed[d].add(event.name)
 
-    dc = Dircolors()
+            for d, names in changed.items():
+                changes = update_entries(dc, d, entries[d], names, sort)
+                if changes and len(dirs) > 1:
+                    print(dc.format(d) + ':')
+                for line in changes:
+                    print(line)
+            sys.stdout.flush()
+
+def dump_index(index, dirname):
+    """ write a snapshot index of dirname for --dump-index. Returns False on error. """
+    # pylint: disable=invalid-name
+    try:
+        write_snapshot(index, dirname)
+    except OSError as e:
+        print('pyls: error: %s'%e, file=sys.stderr)
+        return False
+    return True
+
+def open_metadata(index=None):
+    """ return a SnapshotMetadata for index, or FilesystemMetadata if index is None.
+    Exits with an error if the index can't be opened. """
+    # pylint: disable=invalid-name
+    if index is None:
+        return FilesystemMetadata()
+    try:
+        return SnapshotMetadata(index)
+    except (OSError, ValueError) as e:
+        print('pyls: error: %s'%e, file=sys.stderr)
+        sys.exit(1)
+
+def watch(dc, dirs, sort='name'):
+    """ run watch_dirs() for --watch until interrupted. Returns False on error. """
+    # pylint: disable=invalid-name
+    try:
+        watch_dirs(dc, dirs, sort)
+    except OSError as e:
+        print('pyls: error: %s'%e, file=sys.stderr)
+        return False
+    except KeyboardInterrupt:
+        pass
+    return True
+
+def print_dir(dc, dirname, args):
+    """ print the entries of dirname, one per line or in columns depending on args """
+    def warn_unsorted():
+        print('pyls: %s: more than %d entries, not sorting'%(dirname, args.sort_limit),
+              file=sys.stderr)
+    names = iter_dir(dirname, args.sort, args.sort_limit, dc.metadata, warn_unsorted)
+    if args.layout in ('columns', 'across'):
+        entries = column_entries(dc, list(names), dirname)
+        for line in format_columns(entries, args.width or _line_width(),
+                                   args.layout == 'columns'):
+            print(line)
+    else:
+        for name in names:
+            print(dc.format(name, dirname, show_target=True))
+
+def list_files(dc, files, args):
+    """ print each of files, listing the contents of directories """
+    # pylint: disable=invalid-name
     for f in files:
         try:
-            if os.path.isdir(f) and not os.path.islink(f):
+            if _is_dir(dc.metadata, f):
                 if f != '.' and len(files) > 1:
                     print(dc.format(f) + ':')
-                for ff in sorted(os.listdir(f)):
-                    print(dc.format(ff, f, show_target=True))
+                print_dir(dc, f, args)
                 print()
             else:
                 print(dc.format(f, show_target=True))
         except OSError as e:
             print('%s: error: %s'%(f, e), file=sys.stderr)
+
+def _parse_args():
+    """ parse and check the command line arguments, returns a namespace """
+    # pylint: disable=invalid-name
+    parser = argparse.ArgumentParser(prog='pyls', description='Python implementation of the "ls" '
+                                                              'command for testing dircolors')
+    parser.add_argument('--archive', action='store_true',
+                        help='List the members of tar or zip archives without extracting them')
+    parser.add_argument('--watch', action='store_true',
+                        help='After listing directories, watch them with inotify and print '
+                             'entries as they are added (+), changed (*) or removed (-)')
+    parser.add_argument('--dump-index', metavar='INDEX',
+                        help='Instead of listing, write a snapshot index of DIR to INDEX, '
+                             'which can be listed later with --index')
+    parser.add_argument('--index', metavar='INDEX',
+                        help='List FILEs from a snapshot index written by --dump-index instead '
+                             'of the filesystem. FILEs are relative to the snapshot\'s directory')
+    layout = parser.add_mutually_exclusive_group()
+    layout.add_argument('-1', dest='layout', action='store_const', const='single',
+                        help='List one file per line (the default)')
+    layout.add_argument('-C', dest='layout', action='store_const', const='columns',
+                        help='List entries in columns, sorted down the columns')
+    layout.add_argument('-x', dest='layout', action='store_const', const='across',
+                        help='List entries in columns, sorted across the rows')
+    parser.add_argument('-w', '--width', type=int, metavar='COLS',
+                        help='Set the output width for -C and -x, instead of the terminal width')
+    sort = parser.add_mutually_exclusive_group()
+    sort.add_argument('--sort', choices=sorted(SORT_KEYS) + ['none'], default='name',
+                      help='Sort by WORD instead of name (using the locale\'s collation order)')
+    sort.add_argument('-v', dest='sort', action='store_const', const='version',
+                      help='Natural sort of (version) numbers within names')
+    sort.add_argument('-U', dest='sort', action='store_const', const='none',
+                      help='Do not sort, list entries in directory order')
+    parser.add_argument('--sort-limit', type=int, metavar='N',
+                        help='Do not sort directories with more than N entries, '
+                             'stream them in directory order instead')
+    parser.add_argument('--color-depth', type=int, choices=(256, 16), metavar='{256,16}',
+                        help='Convert colors to the nearest of 256 or 16 colors, '
+                             'for terminals without 24-bit color support')
+    parser.add_argument('files', nargs='*', metavar='FILE', help='File or directories to list')
+    args = parser.parse_args()
+    if args.width is not None and args.width < 1:
+        parser.error('invalid line width: %d'%args.width)
+    modes = [opt for opt, val in (('--archive', args.archive), ('--watch', args.watch),
+                                  ('--dump-index', args.dump_index), ('--index', args.index))
+             if val]
+    if len(modes) > 1:
+        parser.error('%s are mutually exclusive'%' and '.join(modes))
+
+    if not args.files:
+        if args.archive:
+            parser.error('--archive requires at least one FILE')
+        args.files = ['.']
+    if args.dump_index and len(args.files) > 1:
+        parser.error('--dump-index takes a single directory')
+    if args.watch:
+        for f in args.files:
+            if not os.path.isdir(f):
+                parser.error('--watch requires directories, %s is not a directory'%f)
+    return args
+
+def main():
+    """ pyls main function """
+    # pylint: disable=invalid-name
+    args = _parse_args()
+    try:
+        locale.setlocale(locale.LC_COLLATE, '')
+    except locale.Error:
+        pass # invalid locale in the environment, just use C collation
+
+    if args.dump_index:
+        ok = dump_index(args.dump_index, args.files[0])
+    else:
+        dc = Dircolors(depth=args.color_depth, metadata=open_metadata(args.index))
+        if args.archive:
+            ok = list_archives(dc, args.files)
+        elif args.watch:
+            ok = watch(dc, args.files, args.sort)
+        else:
+            list_files(dc, args.files, args)
+            ok = True
+    if not ok:
+        sys.exit(1)
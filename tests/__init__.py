@@ -1,3 +1,7 @@
 """ tests for pydircolors and pyls """
 
 from .test_dircolors import *
+from .test_gnu_ls import *
+from .test_cli import *
+from .test_metadata import *
+from .test_pyls import *
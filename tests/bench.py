@@ -0,0 +1,93 @@
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+
+""" print GNU ls conformance differences, relative pyls throughput,
+`python -m dircolors` startup time, and color depth conversion time """
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from dircolors import Dircolors
+
+from .test_gnu_ls import (_FIXTURES, _KNOWN_DIFFERENCES, _REPO_DIR, _gnu_ls, benchmark,
+                          diff_entries, make_fixture_tree, run_gnu_ls, run_pyls)
+
+def benchmark_startup(repeat=20):
+    """ time shell code generation with `python -m dircolors`, with and without the cache,
+    against a bare python startup and GNU dircolors. Returns a list of (label, seconds)
+    with the best time of `repeat` runs for each. """
+    cache_dir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env['XDG_CACHE_HOME'] = cache_dir
+    env['PYTHONPATH'] = _REPO_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    commands = [
+        ('python startup', [sys.executable, '-c', 'pass']),
+        ('python -m dircolors --no-cache', [sys.executable, '-m', 'dircolors', '-b', '--no-cache']),
+        ('python -m dircolors (cached)', [sys.executable, '-m', 'dircolors', '-b']),
+    ]
+    if shutil.which('dircolors'):
+        commands.append(('GNU dircolors', ['dircolors', '-b']))
+
+    results = []
+    try:
+        for label, cmd in commands:
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.check_call(cmd, env=env, stdout=subprocess.DEVNULL)
+                times.append(time.perf_counter() - start)
+            results.append((label, min(times)))
+    finally:
+        shutil.rmtree(cache_dir)
+    return results
+
+def benchmark_depth(count=10000):
+    """ time converting a theme with count 24-bit extension colors to each color depth.
+    Returns a list of (depth, seconds). """
+    lscolors = ':'.join('*.ext%d=01;38;2;%d;%d;%d'%(i, i % 256, i // 256 % 256, i * 7 % 256)
+                        for i in range(count))
+    dc = Dircolors(load=False)
+    dc.load_from_lscolors(lscolors)
+    results = []
+    for depth in (256, 16):
+        start = time.perf_counter()
+        dc.depth = depth
+        results.append((depth, time.perf_counter() - start))
+    return results
+
+def main():
+    """ print startup time, conformance and relative throughput results """
+    for label, seconds in benchmark_startup():
+        print('%s: %.1fms'%(label, seconds * 1000))
+    for depth, seconds in benchmark_depth():
+        print('convert 10000 24-bit colors to %d colors: %.1fms'%(depth, seconds * 1000))
+
+    ls = _gnu_ls()
+    if ls is None:
+        print('GNU ls not available')
+        return
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        created = make_fixture_tree(tmpdir)
+        names = sorted(os.listdir(tmpdir))
+        diffs = diff_entries(names, run_gnu_ls(ls, tmpdir), run_pyls(tmpdir))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    skipped = sorted(set(name for _, name, _ in _FIXTURES) - set(created))
+    print('%d entries compared, %d differ, skipped: %s'%(len(names), len(diffs),
+                                                        ', '.join(skipped) or 'none'))
+    for name, gnu, py in diffs:
+        note = _KNOWN_DIFFERENCES.get(name, 'UNEXPECTED')
+        print('  %s: ls=%r pyls=%r (%s)'%(name, gnu, py, note))
+
+    ls_time, pyls_time = benchmark(ls)
+    print('ls: %.3fs, pyls: %.3fs, pyls/ls: %.1fx'%(ls_time, pyls_time, pyls_time / ls_time))
+
+if __name__ == '__main__':
+    main()
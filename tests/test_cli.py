@@ -0,0 +1,86 @@
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+#
+# pylint: disable=missing-docstring,protected-access
+
+""" unit tests for the dircolors command line interface """
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dircolors.cli import _parse_args_fast, cached_shell_code, generate_shell_code
+
+__all__ = ['TestShellCode']
+
+class TestShellCode(unittest.TestCase):
+    """ Tests for generating and caching shell code """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.database = os.path.join(self.tmpdir, 'dircolors')
+        with open(self.database, 'w') as file:
+            file.write("TERM xterm\nDIR 01;34\n*'q 01;31\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_generate(self):
+        self.assertEqual(generate_shell_code(self.database, 'xterm'),
+                         "LS_COLORS='di=01;34:*'\\''q=01;31';\nexport LS_COLORS\n")
+        self.assertEqual(generate_shell_code(self.database, 'xterm', 'csh'),
+                         "setenv LS_COLORS 'di=01;34:*'\\''q=01;31'\n")
+        self.assertEqual(generate_shell_code(self.database, 'dumb'),
+                         "LS_COLORS='';\nexport LS_COLORS\n")
+        with self.assertRaises(ValueError):
+            generate_shell_code(self.database, 'xterm', 'fish')
+
+    def test_defaults(self):
+        self.assertIn('di=01;34', generate_shell_code(None, 'xterm'))
+
+    def test_cache(self):
+        expected = generate_shell_code(self.database, 'xterm')
+        self.assertEqual(cached_shell_code(self.database, 'xterm', cache_dir=self.cache_dir),
+                         expected)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # a cache hit returns the cached code as-is
+        cache_file = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(cache_file, 'r') as file:
+            key = file.readline()
+        with open(cache_file, 'w') as file:
+            file.write(key + 'cached')
+        self.assertEqual(cached_shell_code(self.database, 'xterm', cache_dir=self.cache_dir),
+                         'cached')
+
+        # but not if the stored key doesn't match
+        with open(cache_file, 'w') as file:
+            file.write('wrong key\ncached')
+        self.assertEqual(cached_shell_code(self.database, 'xterm', cache_dir=self.cache_dir),
+                         expected)
+
+        # different TERM or shell get their own entries
+        cached_shell_code(self.database, 'dumb', cache_dir=self.cache_dir)
+        cached_shell_code(self.database, 'xterm', 'csh', cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+        # and so does a different color depth
+        cached_shell_code(self.database, 'xterm', cache_dir=self.cache_dir, depth=16)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 4)
+
+    def test_cache_invalidate(self):
+        cached_shell_code(self.database, 'xterm', cache_dir=self.cache_dir)
+        with open(self.database, 'w') as file:
+            file.write('DIR 01;35\n')
+        os.utime(self.database, ns=(0, 0))
+        self.assertEqual(cached_shell_code(self.database, 'xterm', cache_dir=self.cache_dir),
+                         "LS_COLORS='di=01;35';\nexport LS_COLORS\n")
+
+    def test_parse_args_fast(self):
+        self.assertEqual(_parse_args_fast([]), (None, False, None))
+        self.assertEqual(_parse_args_fast(['-c', 'file']), ('csh', False, 'file'))
+        self.assertEqual(_parse_args_fast(['--no-cache', '-b']), ('bourne', True, None))
+        # anything unusual falls back to argparse
+        self.assertIsNone(_parse_args_fast(['-b', '-c']))
+        self.assertIsNone(_parse_args_fast(['-p']))
+        self.assertIsNone(_parse_args_fast(['a', 'b']))
@@ -5,18 +5,22 @@
 
 """ unit tests for the dircolors library """
 
-from io import StringIO
+from io import BytesIO, StringIO
 import os
 import shutil
 import stat
 import sys
+import tarfile
 import tempfile
 import unittest
+import zipfile
 
 from dircolors import Dircolors
+from dircolors._colordepth import convert_sgr
 from dircolors._defaults import DEFAULT_LS_COLORS
 
-__all__ = ['TestDircolorsDB', 'TestDircolorsFormat', 'TestDircolorsFile']
+__all__ = ['TestDircolorsDB', 'TestDircolorsDepth', 'TestDircolorsFormat', 'TestDircolorsFile',
+           'TestDircolorsArchive']
 
 # Test debugging - print some extra output, and don't delete temporary directories
 _DEBUG_ENABLE = False
@@ -60,11 +64,140 @@ class TestDircolorsDB(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.dc.load_from_dircolors(StringIO('LINK 01;36\nfoo\n'), strict=True)
 
+    def test_load_comments(self):
+        # comments can start anywhere after the keyword, but '#' in the keyword is a suffix
+        content = ('# comment\n'
+                   '  #DIR 01;35\n'
+                   'DIR 01;34#comment\n'
+                   'LINK 01;36 #comment\n'
+                   '*# 00;90\n'
+                   'FIFO #40;33\n')
+        self.dc.load_from_dircolors(StringIO(content))
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34:ln=01;36:*#=00;90')
+        with self.assertRaises(ValueError):
+            self.dc.load_from_dircolors(StringIO(content), strict=True)
+
+    def test_load_term(self):
+        content = ('DIR 01;34\n'
+                   'TERM xterm*\n'
+                   'TERM screen\n'
+                   'LINK 01;36\n'
+                   '*~ 00;90\n'
+                   'TERM linux\n'
+                   'FIFO 40;33\n')
+        self.dc.load_from_dircolors(StringIO(content), strict=True)
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34:ln=01;36:pi=40;33:*~=00;90')
+        self.dc.load_from_dircolors(StringIO(content), strict=True, term='screen')
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34:ln=01;36:*~=00;90')
+        self.dc.load_from_dircolors(StringIO(content), strict=True, term='linux')
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34:pi=40;33')
+        self.dc.load_from_dircolors(StringIO(content), strict=True, term='dumb')
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34')
+
     def test_load_lscolors(self):
         self.dc.clear()
         self.dc.load_from_lscolors(DEFAULT_LS_COLORS)
         self.assertEqual(self.dc.generate_lscolors(), DEFAULT_LS_COLORS)
 
+    def test_layers(self):
+        self.dc.load_from_lscolors('di=01;34:ln=01;36:*.tar=01;31')
+        self.assertTrue(self.dc.add_layer('project', 'di=01;35:*.tar=00:*.log=00;90:bogus'))
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;35:ln=01;36:*.tar=00:*.log=00;90')
+        self.dc.add_layer('local', 'ln=target:*.log=01')
+        self.assertEqual(self.dc.layers, ['project', 'local'])
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;35:ln=target:*.tar=00:*.log=01')
+
+        # removing a lower layer keeps the upper layer's overrides
+        self.dc.remove_layer('project')
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34:ln=target:*.tar=01;31:*.log=01')
+
+        # replacing a layer drops the entries it no longer overrides
+        self.dc.add_layer('local', 'ln=04')
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34:ln=04:*.tar=01;31')
+        self.dc.remove_layer('local')
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34:ln=01;36:*.tar=01;31')
+        self.assertEqual(self.dc.layers, [])
+        with self.assertRaises(KeyError):
+            self.dc.remove_layer('local')
+
+    def test_layers_empty_base(self):
+        self.dc.clear()
+        self.assertTrue(self.dc.add_layer('only', 'di=01;34'))
+        self.assertEqual(self.dc.format_mode('dirname', 0o040755), _wrap('dirname', '01;34'))
+        self.assertFalse(self.dc.remove_layer('only'))
+        self.assertFalse(self.dc)
+
+    def test_load_clears_layers(self):
+        self.dc.load_defaults()
+        self.dc.add_layer('project', 'di=01;35')
+        self.dc.load_from_lscolors(DEFAULT_LS_COLORS)
+        self.assertEqual(self.dc.layers, [])
+        self.assertEqual(self.dc.generate_lscolors(), DEFAULT_LS_COLORS)
+
+class TestDircolorsDepth(unittest.TestCase):
+    """ Tests for converting the database to 256 or 16 colors """
+    def setUp(self):
+        self.dc = Dircolors(load=False)
+        self.dc.load_from_lscolors('di=01;38;2;0;0;255:ln=38;5;196:*.tar=48;2;10;10;10;01')
+
+    def test_convert_sgr(self):
+        self.assertEqual(convert_sgr('01;38;2;255;0;0', 256), '01;38;5;196')
+        self.assertEqual(convert_sgr('01;38;2;255;0;0', 16), '01;91')
+        self.assertEqual(convert_sgr('38;2;128;128;128', 256), '38;5;244')
+        self.assertEqual(convert_sgr('38;5;4', 16), '34')
+        self.assertEqual(convert_sgr('38:2::0:0:255', 256), '38;5;21')
+        self.assertEqual(convert_sgr('48;5;250', 16), '47')
+        # anything else is left alone
+        for value in ('01;34', '38;5', '38;2;300;0;0', '38;7;1'):
+            self.assertEqual(convert_sgr(value, 16), value)
+
+    def test_depth(self):
+        self.assertIsNone(self.dc.depth)
+        self.dc.depth = 256
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;38;5;21:ln=38;5;196:*.tar=48;5;232;01')
+        self.dc.depth = 16
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34:ln=91:*.tar=40;01')
+        self.assertEqual(self.dc.format_mode('dirname', 0o040755), _wrap('dirname', '01;34'))
+        self.dc.depth = None
+        self.assertEqual(self.dc.generate_lscolors(),
+                         'di=01;38;2;0;0;255:ln=38;5;196:*.tar=48;2;10;10;10;01')
+        with self.assertRaises(ValueError):
+            self.dc.depth = 8
+        with self.assertRaises(ValueError):
+            Dircolors(depth=24)
+
+    def test_depth_cached(self):
+        self.dc.depth = 16
+        tables = self.dc._out_codes
+        self.dc.depth = 256
+        self.dc.depth = 16
+        self.assertIs(self.dc._out_codes, tables)
+        # loading a new database converts it at the current depth
+        self.dc.load_from_lscolors('di=38;5;9')
+        self.assertEqual(self.dc.generate_lscolors(), 'di=91')
+
+    def test_depth_clear(self):
+        self.dc.depth = 16
+        for clear in (self.dc.clear, lambda: self.dc.load_from_lscolors('')):
+            clear()
+            self.dc.add_layer('x', 'di=38;2;0;0;255')
+            self.assertEqual(self.dc.generate_lscolors(), 'di=34')
+        with self.assertRaises(ValueError):
+            self.dc.load_from_dircolors(StringIO('LINK 38;5;9\nfoo\n'), strict=True)
+        self.dc.add_layer('x', 'di=38;2;0;0;255')
+        self.assertEqual(self.dc.generate_lscolors(), 'ln=91:di=34')
+
+    def test_depth_layers(self):
+        self.dc.depth = 16
+        self.dc.add_layer('local', 'di=38;2;0;255;0:*.log=38;5;8')
+        self.assertEqual(self.dc.generate_lscolors(), 'di=92:ln=91:*.tar=40;01:*.log=90')
+        self.dc.depth = 256
+        self.assertEqual(self.dc.generate_lscolors(),
+                         'di=38;5;46:ln=38;5;196:*.tar=48;5;232;01:*.log=38;5;8')
+        self.dc.remove_layer('local')
+        self.dc.depth = 16
+        self.assertEqual(self.dc.generate_lscolors(), 'di=01;34:ln=91:*.tar=40;01')
+
 class TestDircolorsFormat(unittest.TestCase):
     """ Lower level tests for format_mode with text and a file type+mode int directly """
     def setUp(self):
@@ -83,6 +216,7 @@ class TestDircolorsFormat(unittest.TestCase):
         self.assertEqual(self.dc.format_mode('linkname', 0o120777), _wrap('linkname', '01;36'))
         self.assertEqual(self.dc.format_mode('filename.tar', 0o100644),
                                              '\033[01;31mfilename.tar\033[0m')
+        self.assertEqual(self.dc.format_mode('filename.unknown', 0o100644), 'filename.unknown')
 
 class TestDircolorsFile(unittest.TestCase):
     """ Higher level tests on actual files. """
@@ -147,3 +281,96 @@ class TestDircolorsFile(unittest.TestCase):
         file = os.path.join(self.tmpdir, 'link.png')
         self.assertEqual(self.dc.format(file, show_target=True),
                          '\033[01;36m' + file + '\033[0m -> \033[01;35mimage.png\033[0m')
+
+class TestDircolorsArchive(unittest.TestCase):
+    """ Tests for formatting tar and zip archive members without extracting them """
+
+    # 0: member name
+    # 1: tarfile type
+    # 2: permission bits
+    # 3: link target, or None
+    # 4: expected output
+    _members = [
+        ('subdir',          tarfile.DIRTYPE,    0o755,  None,       _wrap('subdir', '01;34')),
+        ('subdir/file',     tarfile.REGTYPE,    0o644,  None,       'subdir/file'),
+        ('subdir/x.tar',    tarfile.REGTYPE,    0o644,  None,       _wrap('subdir/x.tar', '01;31')),
+        ('execfile',        tarfile.REGTYPE,    0o755,  None,       _wrap('execfile', '01;32')),
+        ('suidfile',        tarfile.REGTYPE,    0o4755, None,       _wrap('suidfile', '37;41')),
+        ('fifo',            tarfile.FIFOTYPE,   0o644,  None,       _wrap('fifo', '40;33')),
+        ('chardev',         tarfile.CHRTYPE,    0o644,  None,       _wrap('chardev', '40;33;01')),
+        ('link.png',        tarfile.SYMTYPE,    0o777,  'x.png',
+         _wrap('link.png', '01;36') + ' -> x.png'),
+        ('hardlink',        tarfile.LNKTYPE,    0o755,  'execfile',
+         _wrap('hardlink', '01;32') + ' link to execfile'),
+    ]
+
+    def setUp(self):
+        self.dc = Dircolors(load=False)
+        self.dc.load_defaults()
+
+    def _make_tar(self, compression=''):
+        buf = BytesIO()
+        with tarfile.open(fileobj=buf, mode='w' + compression) as tar:
+            for name, mtype, mode, target, _ in self._members:
+                info = tarfile.TarInfo(name)
+                info.type = mtype
+                info.mode = mode
+                if target:
+                    info.linkname = target
+                tar.addfile(info)
+        buf.seek(0)
+        return buf
+
+    def test_tar(self):
+        expected = [out for _, _, _, _, out in self._members]
+        self.assertEqual(list(self.dc.format_archive(self._make_tar(), show_target=True)),
+                         expected)
+
+    def test_tar_gz(self):
+        expected = [name for name, _, _, _, _ in self._members]
+        self.dc.clear()
+        self.assertEqual(list(self.dc.format_archive(self._make_tar(':gz'))), expected)
+
+    def test_zip(self):
+        buf = BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zfile:
+            zfile.writestr('subdir/', b'')
+            info = zipfile.ZipInfo('execfile')
+            info.create_system = 3
+            info.external_attr = (stat.S_IFREG | 0o755) << 16
+            zfile.writestr(info, b'')
+            info = zipfile.ZipInfo('link.png')
+            info.create_system = 3
+            info.external_attr = (stat.S_IFLNK | 0o777) << 16
+            zfile.writestr(info, b'x.png')
+            zfile.writestr('image.png', b'')
+        buf.seek(0)
+        self.assertEqual(list(self.dc.format_archive(buf, show_target=True)), [
+            _wrap('subdir', '01;34'),
+            _wrap('execfile', '01;32'),
+            _wrap('link.png', '01;36') + ' -> x.png',
+            _wrap('image.png', '01;35'),
+        ])
+
+    def test_truncated(self):
+        data = self._make_tar(':gz').getvalue()
+        # the members before the damage are still listed
+        members = []
+        with self.assertRaises(ValueError):
+            for line in self.dc.format_archive(BytesIO(data[:len(data) // 2])):
+                members.append(line)
+        self.assertTrue(members)
+        with self.assertRaises(ValueError):
+            list(self.dc.format_archive(BytesIO(data[:5])))
+
+        buf = BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zfile:
+            zfile.writestr('file', b'')
+        # corrupt the central directory, the end of central directory record is still valid
+        data = buf.getvalue().replace(b'PK\x01\x02', b'PK\x00\x00')
+        with self.assertRaises(ValueError):
+            list(self.dc.format_archive(BytesIO(data)))
+
+    def test_not_archive(self):
+        with self.assertRaises(ValueError):
+            list(self.dc.format_archive(BytesIO(b'not an archive' * 100)))
@@ -0,0 +1,283 @@
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+#
+# pylint: disable=missing-docstring
+
+""" differential conformance and throughput harness comparing pyls against GNU ls.
+
+Both programs are run on the same fixture tree with the same LS_COLORS, and their
+colorized output is compared entry by entry. Tests are skipped when a GNU ls isn't
+available. Run `python -m tests.bench` to print a summary and relative throughput. """
+
+import os
+import re
+import shutil
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from dircolors.dircolors import _CODE_MAP
+from dircolors._defaults import DEFAULT_LS_COLORS
+
+__all__ = ['TestGnuLsConformance']
+
+_REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# LS_COLORS as a single line, the way it would appear in the environment
+_LS_COLORS = DEFAULT_LS_COLORS.replace('\n', '')
+
+# Fixture entries, one or more per _CODE_MAP type.
+# 0: lscolors code this entry exercises
+# 1: file name
+# 2: function(dirname, path) which creates it, raises OSError if it can't be created
+def _touch(mode):
+    def make(_, path):
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+        os.chmod(path, mode)
+    return make
+
+def _mkdir(mode):
+    def make(_, path):
+        os.mkdir(path)
+        os.chmod(path, mode)
+    return make
+
+def _symlink(target):
+    def make(_, path):
+        os.symlink(target, path)
+    return make
+
+def _hardlink(_, path):
+    os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o644))
+    os.link(path, path + '.2')
+
+def _fifo(_, path):
+    os.mkfifo(path)
+
+def _socket(_, path):
+    sock = socket.socket(socket.AF_UNIX)
+    try:
+        sock.bind(path)
+    finally:
+        sock.close()
+
+def _device(kind):
+    def make(_, path):
+        # /dev/null's device numbers, requires CAP_MKNOD
+        os.mknod(path, 0o644 | kind, os.makedev(1, 3))
+    return make
+
+def _capability(_, path):
+    _touch(0o644)(_, path)
+    if shutil.which('setcap') is None:
+        raise OSError('setcap not found')
+    if subprocess.call(['setcap', 'cap_net_raw+p', path],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL):
+        raise OSError('setcap failed')
+
+_FIXTURES = [
+    ('rs', 'plainfile',         _touch(0o644)),
+    ('rs', 'noext.unknownext',  _touch(0o644)),
+    ('di', 'subdir',            _mkdir(0o755)),
+    ('ln', 'link',              _symlink('plainfile')),
+    ('ln', 'link.png',          _symlink('image.png')),
+    ('mh', 'hardlink',          _hardlink),
+    ('pi', 'fifo',              _fifo),
+    ('so', 'socket',            _socket),
+    ('bd', 'blockdev',          _device(stat.S_IFBLK)),
+    ('cd', 'chardev',           _device(stat.S_IFCHR)),
+    ('or', 'orphan',            _symlink('does-not-exist')),
+    ('or', 'orphan.tar',        _symlink('missing.tar')),
+    ('su', 'setuid',            _touch(0o4755)),
+    ('sg', 'setgid',            _touch(0o2755)),
+    ('ca', 'capability',        _capability),
+    ('tw', 'sticky_writable',   _mkdir(0o1777)),
+    ('ow', 'other_writable',    _mkdir(0o777)),
+    ('st', 'sticky',            _mkdir(0o1755)),
+    ('ex', 'execfile',          _touch(0o755)),
+    ('ex', 'execfile.tar',      _touch(0o755)),
+    ('*',  'archive.tar',       _touch(0o644)),
+    ('*',  'image.png',         _touch(0o644)),
+]
+
+# codes which can't be produced on this platform at all
+_UNSUPPORTED_CODES = {
+    'do': 'doors only exist on Solaris',
+}
+
+# codes which only color symlink targets, mapped to the fixture code whose targets use them.
+# These are compared by test_targets rather than test_entries.
+_TARGET_CODES = {
+    'mi': 'or',
+}
+
+# Known, documented divergences between pyls and GNU ls. Entries here are reported
+# but don't fail the conformance test.
+_KNOWN_DIFFERENCES = {
+    'orphan': 'GNU ls colors broken link names with "or", pyls uses "ln"',
+    'orphan.tar': 'GNU ls colors broken link names with "or", pyls uses "ln"',
+    'capability': 'pyls does not read security.capability xattrs',
+}
+
+def _gnu_ls():
+    """ return the path to a GNU ls binary, or None if one isn't available """
+    for name in ('gls', 'ls'):
+        path = shutil.which(name)
+        if path is None:
+            continue
+        try:
+            out = subprocess.check_output([path, '--version'], stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.CalledProcessError):
+            continue
+        if b'GNU coreutils' in out:
+            return path
+    return None
+
+def _env():
+    env = dict(os.environ)
+    env['LS_COLORS'] = _LS_COLORS
+    env['LC_ALL'] = 'C'
+    env['PYTHONPATH'] = _REPO_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+def make_fixture_tree(dirname):
+    """ populate dirname with _FIXTURES. Returns a dict mapping the created file names
+    to their lscolors code. Entries which can't be created here are left out. """
+    created = {}
+    for code, name, make in _FIXTURES:
+        path = os.path.join(dirname, name)
+        try:
+            make(dirname, path)
+        except OSError:
+            if os.path.lexists(path):
+                os.unlink(path)
+            continue
+        created[name] = code
+        if make is _hardlink:
+            created[name + '.2'] = code
+    return created
+
+_SGR_RE = re.compile('\033\\[[0-9;]*m')
+
+def run_gnu_ls(ls, dirname, options=('-1',)):
+    """ run GNU ls on dirname and return its colorized output lines """
+    out = subprocess.check_output([ls, '--color=always'] + list(options) + [dirname],
+                                  env=_env()).decode()
+    # GNU ls emits a reset before the first colored entry, and may emit
+    # clear-to-end-of-line sequences after entries which could wrap.
+    out = out.replace('\033[0m\033[', '\033[', 1)
+    return out.replace('\033[K', '').splitlines()
+
+def run_pyls(dirname, options=()):
+    """ run pyls on dirname and return its colorized output lines. In the default
+    one-per-line mode, symlink targets are removed to match `ls -1` """
+    out = subprocess.check_output([sys.executable, '-m', 'dircolors.pyls'] + list(options) +
+                                  [dirname], env=_env())
+    lines = [line for line in out.decode().splitlines() if line]
+    if options:
+        return lines
+    return [line.split(' -> ', 1)[0] for line in lines]
+
+def diff_entries(names, gnu_lines, pyls_lines):
+    """ compare the outputs entry by entry. Returns a list of
+    (name, gnu_line, pyls_line) tuples for every entry which differs. """
+    if not len(names) == len(gnu_lines) == len(pyls_lines):
+        raise ValueError('entry count mismatch: %d names, %d ls lines, %d pyls lines'%(
+            len(names), len(gnu_lines), len(pyls_lines)))
+    return [(name, gnu, py) for name, gnu, py in zip(names, gnu_lines, pyls_lines) if gnu != py]
+
+def link_targets(lines):
+    """ return a dict mapping the (uncolored) name of each symlink in `ls -l` or pyls
+    output lines to its colorized target. pyls's " [broken link]" suffix is removed. """
+    targets = {}
+    for line in lines:
+        link, sep, target = line.partition(' -> ')
+        if sep:
+            name = _SGR_RE.sub('', link).rsplit(' ', 1)[-1]
+            targets[name] = target.replace(' [broken link]', '')
+    return targets
+
+def benchmark(ls, count=5000, repeat=3):
+    """ time GNU ls and pyls listing a directory of `count` mixed entries.
+    Returns a tuple of the best (ls_seconds, pyls_seconds) out of `repeat` runs. """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        makers = [_touch(0o644), _touch(0o755), _mkdir(0o755), _symlink('f0')]
+        exts = ['', '.tar', '.png', '.txt', '.mp3']
+        for i in range(count):
+            name = 'f%d%s'%(i, exts[i % len(exts)])
+            makers[i % len(makers)](tmpdir, os.path.join(tmpdir, name))
+
+        def best(func):
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func(tmpdir)
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        return best(lambda d: run_gnu_ls(ls, d)), best(run_pyls)
+    finally:
+        shutil.rmtree(tmpdir)
+
+@unittest.skipIf(_gnu_ls() is None, 'GNU ls not available')
+class TestGnuLsConformance(unittest.TestCase):
+    """ Compare pyls against GNU ls on a fixture tree covering every _CODE_MAP type """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ls = _gnu_ls()
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.created = make_fixture_tree(cls.tmpdir)
+        cls.names = sorted(os.listdir(cls.tmpdir))
+        cls.gnu_lines = run_gnu_ls(cls.ls, cls.tmpdir)
+        cls.pyls_lines = run_pyls(cls.tmpdir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_fixtures_cover_code_map(self):
+        fixture_codes = set(code for code, _, _ in _FIXTURES)
+        created_codes = set(self.created.values())
+        for code in _CODE_MAP.values():
+            with self.subTest(code=code):
+                if code in _UNSUPPORTED_CODES:
+                    continue
+                fixture_code = _TARGET_CODES.get(code, code)
+                self.assertIn(fixture_code, fixture_codes, 'no fixture for %s'%code)
+                if fixture_code not in created_codes:
+                    self.skipTest('no %s fixture could be created here'%code)
+
+    def test_entries(self):
+        diffs = dict((name, (gnu, py)) for name, gnu, py in
+                     diff_entries(self.names, self.gnu_lines, self.pyls_lines))
+        for name in self.names:
+            with self.subTest(file=name):
+                if name in _KNOWN_DIFFERENCES:
+                    continue
+                self.assertNotIn(name, diffs, 'ls: %r, pyls: %r'%diffs.get(name, ('', '')))
+
+    def test_targets(self):
+        # symlink targets are colored by their own type, or 'mi' when missing
+        gnu = link_targets(run_gnu_ls(self.ls, self.tmpdir, ['-l']))
+        pyls = link_targets(run_pyls(self.tmpdir, ['-1']))
+        links = sorted(name for name, code in self.created.items() if code in ('ln', 'or'))
+        self.assertEqual(sorted(gnu), links)
+        self.assertEqual(sorted(pyls), links)
+        for name in links:
+            with self.subTest(file=name):
+                self.assertEqual(gnu[name], pyls[name])
+
+    def test_columns(self):
+        # colors are compared entry by entry above, this only checks the layout
+        for options in (['-C', '-w', '80'], ['-x', '-w', '80'], ['-C', '-w', '30'],
+                        ['-x', '-w', '1']):
+            with self.subTest(options=options):
+                gnu = [_SGR_RE.sub('', line) for line in run_gnu_ls(self.ls, self.tmpdir, options)]
+                pyls = [_SGR_RE.sub('', line) for line in run_pyls(self.tmpdir, options)]
+                self.assertEqual(gnu, pyls)
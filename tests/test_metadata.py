@@ -0,0 +1,132 @@
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+#
+# pylint: disable=missing-docstring,protected-access
+
+""" unit tests for the dircolors metadata providers """
+
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from dircolors import Dircolors
+from dircolors.metadata import (FilesystemMetadata, MetadataProvider, SnapshotMetadata,
+                                write_snapshot)
+from dircolors.pyls.pyls import iter_dir
+
+__all__ = ['TestMetadataProvider', 'TestSnapshot']
+
+class TestMetadataProvider(unittest.TestCase):
+    def test_abstract(self):
+        class Incomplete(MetadataProvider): # pylint: disable=abstract-method
+            def mode(self, file, cwd=None, follow_symlinks=False):
+                return 0
+        with self.assertRaises(TypeError):
+            Incomplete() # pylint: disable=abstract-class-instantiated
+        with FilesystemMetadata() as metadata:
+            self.assertTrue(stat.S_ISDIR(metadata.mode('.')))
+
+class TestSnapshot(unittest.TestCase):
+    """ Tests for writing snapshot indexes and formatting from them """
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, 'root')
+        self.index = os.path.join(self.tmpdir, 'index')
+        os.makedirs(os.path.join(self.root, 'subdir'))
+        for name, mode in (('file.tar', 0o644), ('script', 0o755), ('subdir/nested', 0o644)):
+            os.close(os.open(os.path.join(self.root, name), os.O_WRONLY | os.O_CREAT, mode))
+        os.symlink('file.tar', os.path.join(self.root, 'link'))
+        os.symlink('missing', os.path.join(self.root, 'orphan'))
+        os.symlink('subdir', os.path.join(self.root, 'dirlink'))
+        os.symlink(os.path.join(self.root, 'script'), os.path.join(self.root, 'abslink'))
+        os.symlink('loop', os.path.join(self.root, 'loop'))
+        # goes above the root and back into it
+        os.symlink('../root/file.tar', os.path.join(self.root, 'rellink'))
+        os.symlink('../outside', os.path.join(self.root, 'outlink'))
+        self.assertEqual(write_snapshot(self.index, self.root), 12)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_matches_filesystem(self):
+        live = Dircolors()
+        live.load_defaults()
+        with SnapshotMetadata(self.index) as metadata:
+            snap = Dircolors(metadata=metadata)
+            snap.load_defaults()
+            for name in sorted(os.listdir(self.root)) + ['subdir/nested', 'nested', 'nothere']:
+                for follow in (False, True):
+                    with self.subTest(name=name, follow=follow):
+                        self.assertEqual(snap.format(name, follow_symlinks=follow,
+                                                     show_target=True),
+                                         live.format(name, self.root, follow_symlinks=follow,
+                                                     show_target=True))
+            # lookups through a symlinked directory
+            self.assertEqual(snap.format('nested', 'dirlink'),
+                             live.format('nested', os.path.join(self.root, 'subdir')))
+
+    def test_provider(self):
+        with SnapshotMetadata(self.index) as metadata:
+            self.assertTrue(stat.S_ISDIR(metadata.mode('.')))
+            self.assertTrue(stat.S_ISDIR(metadata.mode(self.root)))
+            self.assertTrue(stat.S_ISLNK(metadata.mode('dirlink')))
+            self.assertTrue(stat.S_ISDIR(metadata.mode('dirlink', follow_symlinks=True)))
+            self.assertEqual(metadata.readlink('link'), 'file.tar')
+            self.assertEqual(sorted(metadata.listdir('dirlink')), ['nested'])
+            self.assertEqual(list(iter_dir('.', metadata=metadata))[:3],
+                             ['abslink', 'dirlink', 'file.tar'])
+            self.assertEqual(list(iter_dir('subdir/..', metadata=metadata))[:3],
+                             ['abslink', 'dirlink', 'file.tar'])
+            self.assertTrue(stat.S_ISREG(metadata.mode('../root/file.tar')))
+            for path in ('nothere', '../outside', '/etc', 'file.tar/x'):
+                with self.assertRaises(OSError):
+                    metadata.mode(path)
+            with self.assertRaises(OSError):
+                metadata.listdir('script')
+            with self.assertRaises(OSError):
+                metadata.readlink('script')
+            with self.assertRaises(ValueError):
+                metadata.mode('file.tar', 3)
+
+    def test_bad_index(self):
+        with self.assertRaises(OSError):
+            SnapshotMetadata(os.path.join(self.tmpdir, 'nothere'))
+        with self.assertRaises(ValueError):
+            SnapshotMetadata(os.path.join(self.root, 'script'))
+        with self.assertRaises(OSError) as cm:
+            write_snapshot(self.index, os.path.join(self.root, 'script'))
+        self.assertEqual(cm.exception.errno, errno.ENOTDIR)
+        with self.assertRaises(OSError) as cm:
+            write_snapshot(self.index, os.path.join(self.tmpdir, 'nothere'))
+        self.assertEqual(cm.exception.errno, errno.ENOENT)
+        with self.assertRaises(OSError):
+            write_snapshot(os.path.join(self.tmpdir, 'nothere', 'index'), self.root)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['index', 'root'])
+
+    def test_index_in_root(self):
+        # the temporary index written while walking isn't recorded
+        index = os.path.join(self.root, 'snap.idx')
+        write_snapshot(index, self.root)
+        expected = sorted(os.listdir(self.root))
+        expected.remove('snap.idx') # didn't exist yet during the walk
+        with SnapshotMetadata(index) as metadata:
+            self.assertEqual(sorted(metadata.listdir('.')), expected)
+        # writing it again records the previous index, which is still there afterwards
+        write_snapshot(index, self.root)
+        with SnapshotMetadata(index) as metadata:
+            self.assertEqual(sorted(metadata.listdir('.')), sorted(os.listdir(self.root)))
+
+    def test_link_in_cwd(self):
+        dc = Dircolors()
+        dc.load_defaults()
+        self.assertIsInstance(dc.metadata, FilesystemMetadata)
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        try:
+            self.assertEqual(dc.format('link', show_target=True),
+                             '\033[01;36mlink\033[0m -> \033[01;31mfile.tar\033[0m')
+        finally:
+            os.chdir(cwd)
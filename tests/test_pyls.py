@@ -0,0 +1,155 @@
+# Copyright 2019 Allen Wild <allenwild93@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+#
+# pylint: disable=missing-docstring,protected-access
+
+""" unit tests for pyls """
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from dircolors import Dircolors
+from dircolors.pyls import _inotify
+from dircolors.pyls._columns import calculate_columns, display_width, format_columns
+from dircolors.pyls._sort import sort_names
+from dircolors.pyls.pyls import column_entries, iter_dir, list_dir, update_entries
+
+__all__ = ['TestInotify', 'TestWatchUpdate', 'TestColumns', 'TestSort']
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is Linux-only')
+class TestInotify(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_events(self):
+        with _inotify.Inotify() as inotify:
+            wd = inotify.add_watch(self.tmpdir, _inotify.IN_CREATE | _inotify.IN_ATTRIB)
+            path = os.path.join(self.tmpdir, 'file')
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o644))
+            os.chmod(path, 0o755)
+            events = inotify.read_events()
+        self.assertEqual([(e.wd, e.mask, e.name) for e in events],
+                         [(wd, _inotify.IN_CREATE, 'file'), (wd, _inotify.IN_ATTRIB, 'file')])
+
+    def test_bad_watch(self):
+        with _inotify.Inotify() as inotify:
+            with self.assertRaises(FileNotFoundError):
+                inotify.add_watch(os.path.join(self.tmpdir, 'nonexistent'), _inotify.IN_CREATE)
+
+class TestWatchUpdate(unittest.TestCase):
+    """ Tests for the incremental update of a directory listing """
+    def setUp(self):
+        self.dc = Dircolors(load=False)
+        self.dc.load_defaults()
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ('file', 'image.png'):
+            self._touch(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _touch(self, name, mode=0o644):
+        os.close(os.open(os.path.join(self.tmpdir, name), os.O_WRONLY | os.O_CREAT, mode))
+
+    def test_update(self):
+        entries = list_dir(self.dc, self.tmpdir)
+        self.assertEqual(entries, {'file': 'file', 'image.png': '\033[01;35mimage.png\033[0m'})
+
+        self._touch('new.tar')
+        os.chmod(os.path.join(self.tmpdir, 'file'), 0o755)
+        os.unlink(os.path.join(self.tmpdir, 'image.png'))
+        changes = update_entries(self.dc, self.tmpdir, entries,
+                                 ['file', 'image.png', 'new.tar', 'already-gone'])
+        self.assertEqual(changes, ['* \033[01;32mfile\033[0m', '- image.png',
+                                   '+ \033[01;31mnew.tar\033[0m'])
+        self.assertEqual(entries, list_dir(self.dc, self.tmpdir))
+
+        # touching an entry without changing its format reports nothing
+        self.assertEqual(update_entries(self.dc, self.tmpdir, entries, ['new.tar']), [])
+
+class TestColumns(unittest.TestCase):
+    """ Tests for multi-column layout """
+    def test_display_width(self):
+        self.assertEqual(display_width('file.txt'), 8)
+        self.assertEqual(display_width('\u6f22\u5b57.png'), 8)      # wide CJK characters
+        self.assertEqual(display_width('e\u0301.txt'), 5)           # combining accent
+        self.assertEqual(display_width('\uff21'), 2)                # fullwidth A
+        self.assertEqual(display_width(''), 0)
+
+    def test_calculate_columns(self):
+        # 2 + 2 spaces per column, the last column doesn't need separator space
+        self.assertEqual(calculate_columns([2] * 6, 12), (3, [4, 4, 3]))
+        self.assertEqual(calculate_columns([2] * 6, 40), (6, [4, 4, 4, 4, 4, 3]))
+        self.assertEqual(calculate_columns([30, 30], 40), (1, [30]))
+        self.assertEqual(calculate_columns([1], 1), (1, [3]))
+
+    def test_format_columns(self):
+        entries = [(name, len(name)) for name in ('a', 'bb', 'ccc', 'd', 'eeeee')]
+        self.assertEqual(format_columns(entries, 12), ['a    d', 'bb   eeeee', 'ccc'])
+        self.assertEqual(format_columns(entries, 12, by_columns=False),
+                         ['a      bb', 'ccc    d', 'eeeee'])
+        self.assertEqual(format_columns([], 80), [])
+
+    def test_colored_entries(self):
+        dc = Dircolors(load=False)
+        dc.load_defaults()
+        tmpdir = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(tmpdir, 'dir'))
+            entries = column_entries(dc, ['dir', 'missing'], tmpdir)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(entries[0], ('\033[01;34mdir\033[0m', 3))
+        # errors are shown uncolored, and measured including the error message
+        self.assertEqual(entries[1][1], len(entries[1][0]))
+        self.assertEqual(format_columns(entries[:1] * 3, 20), ['\033[01;34mdir\033[0m  ' * 2 +
+                                                             '\033[01;34mdir\033[0m'])
+
+class TestSort(unittest.TestCase):
+    """ Tests for name and version sorting """
+
+    # the output of `LC_ALL=C ls -A1v` on a directory with these files
+    _version_sorted = [
+        '.a1', '.x', '.0', '..Z', '..y', '001', '01', '1', 'B2', 'a~', 'a0~', 'a', 'a0',
+        'a.tar', 'a1~', 'a1', 'a1.tar.gz', 'a1a', 'a2', 'a10', 'a-1', 'b1.01', 'b1.1',
+        'b1.10', 'x~', 'x.~1', 'x.tar', '_z',
+    ]
+
+    def test_version(self):
+        names = sorted(self._version_sorted, reverse=True)
+        self.assertEqual(sort_names(names, 'version'), self._version_sorted)
+        self.assertEqual(sort_names(['.', '..', '.a', 'a'], 'version'), ['.', '..', '.a', 'a'])
+
+    def test_name(self):
+        # the test runner's locale isn't changed, so this is plain codepoint order
+        self.assertEqual(sort_names(['b', 'B', 'a10', 'a2'], 'name'), ['B', 'a10', 'a2', 'b'])
+        self.assertEqual(sort_names(['b', 'a'], 'none'), ['b', 'a'])
+
+    def test_iter_dir(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            names = ['file%d'%i for i in range(10)]
+            for name in names:
+                os.close(os.open(os.path.join(tmpdir, name), os.O_WRONLY | os.O_CREAT, 0o644))
+            self.assertEqual(list(iter_dir(tmpdir, 'version')), names)
+            self.assertEqual(list(iter_dir(tmpdir, 'version', limit=10)), names)
+            self.assertEqual(sorted(iter_dir(tmpdir, 'none')), sorted(names))
+
+            # over the limit, all entries are still listed, just not sorted
+            unsorted = []
+            self.assertEqual(sorted(iter_dir(tmpdir, 'version', limit=10,
+                                             on_unsorted=lambda: unsorted.append(True))),
+                             names)
+            self.assertEqual(unsorted, [])
+            streamed = list(iter_dir(tmpdir, 'version', limit=3,
+                                     on_unsorted=lambda: unsorted.append(True)))
+            self.assertEqual(sorted(streamed), sorted(names))
+            self.assertEqual(unsorted, [True])
+        finally:
+            shutil.rmtree(tmpdir)